@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Calculator, CalculatorPDF, Transaction, Portfolio
+from .models import Calculator, CalculatorPDF, Transaction, Portfolio, ParseJob, ParsedStatement, CalculationResult, LotCheckpoint
 # Register your models here.
 
 class CalculatorAdmin(admin.ModelAdmin):
@@ -11,7 +11,11 @@ class CalculatorAdmin(admin.ModelAdmin):
 
 admin.site.register(Calculator, CalculatorAdmin)
 
-class CalculatorPDFAdmin(admin.ModelAdmin):
+class LargeTableAdmin(admin.ModelAdmin):
+    # Counting the whole table on every page view is a full scan.
+    show_full_result_count = False
+
+class CalculatorPDFAdmin(LargeTableAdmin):
     list_display = ('calculator', 'pdf', 'uploaded_at')
     list_filter = ('calculator__id',)
     search_fields = ('calculator__id', 'calculator__name')
@@ -20,7 +24,7 @@ class CalculatorPDFAdmin(admin.ModelAdmin):
 
 admin.site.register(CalculatorPDF, CalculatorPDFAdmin)
 
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(LargeTableAdmin):
     list_display = ('pdf', 'date', 'symbol', 'transaction_type', 'price', 'quantity')
     list_filter = ('pdf__calculator__id',)
     search_fields = ('pdf__calculator__id', 'pdf__calculator__name', 'date', 'symbol', 'transaction_type', 'price', 'quantity')
@@ -29,11 +33,46 @@ class TransactionAdmin(admin.ModelAdmin):
 
 admin.site.register(Transaction, TransactionAdmin)
 
-class PortfolioAdmin(admin.ModelAdmin):
+class PortfolioAdmin(LargeTableAdmin):
     list_display = ('pdf', 'date', 'symbol', 'quantity', 'buy_price', 'profit')
     list_filter = ('pdf__calculator__id',)
     search_fields = ('pdf__calculator__id', 'pdf__calculator__name', 'symbol')
     list_per_page = 50
     ordering = ('-pdf__calculator__id',)
 
-admin.site.register(Portfolio, PortfolioAdmin)
\ No newline at end of file
+admin.site.register(Portfolio, PortfolioAdmin)
+
+class ParseJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'pdf', 'status', 'created_at', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('pdf__calculator__id', 'error')
+    list_per_page = 25
+    ordering = ('-id',)
+
+admin.site.register(ParseJob, ParseJobAdmin)
+
+class ParsedStatementAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'parser_version', 'hits', 'misses', 'created_at', 'updated_at')
+    list_filter = ('parser_version',)
+    search_fields = ('sha256',)
+    list_per_page = 25
+    ordering = ('-updated_at',)
+
+admin.site.register(ParsedStatement, ParsedStatementAdmin)
+
+class CalculationResultAdmin(admin.ModelAdmin):
+    list_display = ('calculator', 'fingerprint', 'updated_at')
+    search_fields = ('calculator__id', 'fingerprint')
+    list_per_page = 25
+    ordering = ('-updated_at',)
+
+admin.site.register(CalculationResult, CalculationResultAdmin)
+
+class LotCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('calculator', 'portfolio_date', 'fingerprint', 'created_at')
+    list_filter = ('calculator',)
+    search_fields = ('calculator__id', 'fingerprint')
+    list_per_page = 25
+    ordering = ('-portfolio_date',)
+
+admin.site.register(LotCheckpoint, LotCheckpointAdmin)
@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CalculatorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'calculator'
+
+    def ready(self):
+        from .db import configure_sqlite
+        connection_created.connect(configure_sqlite, dispatch_uid='calculator.configure_sqlite')
@@ -0,0 +1,96 @@
+"""
+Async versions of the upload, results and create-calculator views, routed
+when CALCULATOR_ASYNC_VIEWS is on (vergihesapla/asgi.py turns it on).
+
+Under ASGI the request body is received without holding a thread, so a slow
+upload costs a coroutine rather than a thread. Django 4.0 has no async ORM:
+short queries go through sync_to_async, and the heavy parts (storing the
+upload, parsing it when there is no parse pool, the FIFO calculation and
+rendering) run on a pool of CALCULATOR_ASYNC_WORKERS threads, which bounds
+how many of them run at once.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.shortcuts import render
+
+from . import views
+from .models import Calculator
+from .timing import stage
+
+executor = ThreadPoolExecutor(max_workers=settings.CALCULATOR_ASYNC_WORKERS, thread_name_prefix="calculator-async")
+
+
+def _run(function, *args):
+    # Pool threads outlive requests; check their connections like a request would.
+    close_old_connections()
+    return function(*args)
+
+
+async def offload(function, *args):
+    """Runs function(*args) on the bounded pool and waits for the result."""
+    return await sync_to_async(_run, thread_sensitive=False, executor=executor)(function, *args)
+
+
+async def load_files(request):
+    # Parsing the multipart body writes uploads to temporary files.
+    return await sync_to_async(lambda: request.FILES)()
+
+
+async def create_id_calculator(request):
+    if request.method != 'POST':
+        return HttpResponseBadRequest("Invalid request method")
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return HttpResponseBadRequest("Invalid JSON data")
+    calculator_id = data.get('calculator_id')
+    if calculator_id is None:
+        calculator = await sync_to_async(Calculator.objects.create)(name="default_calculator")
+        calculator_id = calculator.id
+    return JsonResponse({'calculator_id': calculator_id})
+
+
+async def upload_pdf(request):
+    if request.method != 'POST':
+        return HttpResponseBadRequest("Invalid request method")
+    files = await load_files(request)
+    calculator, error = await sync_to_async(views.get_upload_calculator)(request)
+    if error:
+        return error
+    pdf_file = files.get('pdf')
+    if not pdf_file:
+        return JsonResponse({'error': 'PDF file is required'}, status=400)
+    job = await offload(views.queue_upload, calculator, pdf_file)
+    return views.upload_response(calculator, job)
+
+
+async def upload_pdfs(request):
+    if request.method != 'POST':
+        return HttpResponseBadRequest("Invalid request method")
+    files = await load_files(request)
+    calculator, error = await sync_to_async(views.get_upload_calculator)(request)
+    if error:
+        return error
+    uploads = files.getlist('files')
+    if not uploads:
+        return JsonResponse({'error': 'At least one file is required'}, status=400)
+    results = await offload(views.queue_statements, calculator, uploads)
+    return JsonResponse({'calculator_id': calculator.id, 'results': results}, status=202)
+
+
+async def get_results(request):
+    if request.method != 'POST':
+        return await offload(render, request, 'vergihesapla/results.html')
+    data = json.loads(request.body)
+    try:
+        with stage("results_cache"):
+            cal_context = await offload(views.get_calculation, data.get('calculator_id'))
+    except Calculator.DoesNotExist:
+        return JsonResponse({'error': 'Calculator not found'}, status=404)
+    with stage("render"):
+        return await offload(render, request, 'vergihesapla/results.html', views.results_context(cal_context))
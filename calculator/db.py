@@ -0,0 +1,120 @@
+"""
+SQLite connection setup and the single writer thread.
+
+Every new SQLite connection is switched to WAL journaling with the pragmas
+in SQLITE_PRAGMAS (except databases in SQLITE_KEEP_JOURNAL_MODE), so readers
+(results pages) work from a snapshot and never wait for a writer. SQLite still allows only one writer at a time; instead of
+having threads contend for the write lock, statement ingestion hands its
+writes to one writer thread per process with `write()` and waits for the
+result. Writes run in submission order on the writer's own connection.
+
+The writer only serializes writes within its process, so parse pool
+workers do not write at all: they hand the parsed statement back and the web
+process saves it with `write_later()` (see calculator/jobs.py).
+"""
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """connection_created receiver applying SQLITE_PRAGMAS."""
+    if connection.vendor != 'sqlite':
+        return
+    keep_journal_mode = str(connection.settings_dict['NAME']) in settings.SQLITE_KEEP_JOURNAL_MODE
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            if name == 'journal_mode' and keep_journal_mode:
+                continue
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+class Writer:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, function, *args, **kwargs) -> Future:
+        future = Future()
+        # The caller's context goes along, so timing stages still add up.
+        context = contextvars.copy_context()
+        self.queue.put((future, context, function, args, kwargs))
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="calculator-writer", daemon=True)
+                self.thread.start()
+        return future
+
+    def run(self):
+        while True:
+            future, context, function, args, kwargs = self.queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            # Like a request: drop the connection if it outlived CONN_MAX_AGE
+            # or broke, otherwise keep reusing it.
+            close_old_connections()
+            try:
+                future.set_result(context.run(function, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+writer = Writer()
+
+
+def write(function, *args, **kwargs):
+    """
+    Runs function(*args, **kwargs) on the writer thread and returns its
+    result. Inside an atomic block, or with CALCULATOR_WRITER_THREAD off, it
+    runs inline: the write has to be part of the caller's transaction. On
+    the writer thread itself it runs inline too.
+    """
+    if (not settings.CALCULATOR_WRITER_THREAD or connection.in_atomic_block
+            or threading.current_thread() is writer.thread):
+        return function(*args, **kwargs)
+    return writer.submit(function, *args, **kwargs).result()
+
+
+def write_later(function, *args, **kwargs) -> Future:
+    """
+    Queues function(*args, **kwargs) on the writer thread and returns its
+    Future without waiting, for callers that must not block (pool
+    done-callbacks). Used whatever CALCULATOR_WRITER_THREAD says. Nobody
+    waits for the result, so errors are logged.
+    """
+    future = writer.submit(function, *args, **kwargs)
+    future.add_done_callback(log_write_error)
+    return future
+
+
+def log_write_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Queued write failed", exc_info=future.exception())
+
+
+def retry_locked(function, *args, attempts=5, delay=0.1, **kwargs):
+    """
+    Runs function(*args, **kwargs), retrying with exponential backoff while
+    SQLite reports "database is locked". A transaction that read before it
+    wrote gets that error at once, without waiting for busy_timeout, when
+    another process committed in between. Inside an atomic block there is
+    nothing to retry, so the error goes to the caller.
+    """
+    for attempt in range(attempts):
+        try:
+            return function(*args, **kwargs)
+        except OperationalError as e:
+            if "database is locked" not in str(e) or connection.in_atomic_block or attempt == attempts - 1:
+                raise
+            logger.warning("Database is locked, retrying in %.1fs", delay)
+            time.sleep(delay)
+            delay *= 2
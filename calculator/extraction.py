@@ -0,0 +1,58 @@
+import atexit
+import math
+
+from pypdf import PdfReader
+
+from . import workers as pool
+from .workers import process_pool
+
+_executor = None
+_executor_size = 0
+
+def get_executor(workers):
+    global _executor, _executor_size
+    if _executor is None or _executor_size != workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = process_pool(workers, django=False)
+        _executor_size = workers
+    return _executor
+
+@atexit.register
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+def extract_page_range(path, start, stop):
+    """Worker entry point: extract the text of pages [start, stop) of a PDF."""
+    reader = PdfReader(path, strict=True)
+    return [reader.pages[i].extract_text() for i in range(start, stop)]
+
+def page_ranges(page_count, chunks):
+    """Split page_count pages into at most `chunks` contiguous (start, stop) ranges."""
+    size = math.ceil(page_count / chunks)
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+def iter_page_texts(reader: PdfReader, path, workers=1, min_pages=1):
+    """
+    Yields the extracted text of every page in page order.
+    With workers > 1 and at least min_pages pages, page ranges are extracted
+    in a process pool; smaller documents are extracted serially since the
+    round trip to the pool costs more than it saves. Workers of another
+    pool (e.g. parse jobs) always extract serially.
+    """
+    page_count = len(reader.pages)
+    if workers <= 1 or pool.in_pool_worker or page_count < max(min_pages, 2):
+        for page in reader.pages:
+            yield page.extract_text()
+        return
+
+    ranges = page_ranges(page_count, workers)
+    executor = get_executor(workers)
+    starts = [start for start, _ in ranges]
+    stops = [stop for _, stop in ranges]
+    # map() returns results in submission order, so pages stay in order.
+    for texts in executor.map(extract_page_range, [path] * len(ranges), starts, stops):
+        yield from texts
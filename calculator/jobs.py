@@ -0,0 +1,153 @@
+import logging
+from collections import namedtuple
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import timing
+from .db import write_later
+from .models import CalculatorPDF, ParseJob
+from .midas import Midas
+from .statement import MidasStatement
+from .workers import process_pool
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = process_pool(settings.CALCULATOR_PARSE_WORKERS)
+    return _executor
+
+def enqueue_parse(pdf_object: CalculatorPDF) -> ParseJob:
+    """
+    Queues a parse job for an uploaded statement and returns it right away.
+    With CALCULATOR_PARSE_WORKERS = 0 the job runs inline instead.
+    """
+    job = ParseJob.objects.create(pdf=pdf_object)
+    if settings.CALCULATOR_PARSE_WORKERS > 0:
+        transaction.on_commit(lambda: submit(job.id))
+    else:
+        timing.stats.record(run_parse_job(job.id))
+        job.refresh_from_db()
+    return job
+
+def submit(job_id):
+    global _executor
+    try:
+        future = get_executor().submit(parse_job, job_id)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed by the OOM killer); start a fresh pool.
+        _executor = None
+        future = get_executor().submit(parse_job, job_id)
+    future.add_done_callback(lambda future: job_finished(job_id, future))
+    return future
+
+# What a pool worker hands back: the statement as MidasStatement.to_dict(),
+# or the error that stopped it, and the worker's stage timings.
+ParsedJob = namedtuple('ParsedJob', ['statement', 'sha256', 'cached', 'error', 'timings'])
+
+def parse_job(job_id) -> ParsedJob:
+    """
+    Pool task: parses the job's statement without writing to the database.
+    Workers are separate processes, so their writes would contend for
+    SQLite's lock with every other process; saving is left to job_finished.
+    """
+    job = ParseJob.objects.get(id=job_id)
+    collector = timing.start()
+    try:
+        midas = Midas(checked_pdf(job.pdf_id), save=False)
+    except Exception as e:
+        return ParsedJob(None, None, None, str(e), timing.finish(collector))
+    return ParsedJob(midas.statement.to_dict(), midas.sha256, midas.cached, None, timing.finish(collector))
+
+def job_finished(job_id, future):
+    """
+    Done-callback of a pooled job, run on the pool's management thread in
+    this process. The job is saved (or failed, when the worker crashed, the
+    pool could not start it or it was cancelled) on the writer thread, so it
+    does not hold up the pool.
+    """
+    if future.cancelled():
+        error = "Parse job was cancelled"
+    else:
+        error = future.exception()
+        if error is None:
+            write_later(save_parsed_job, job_id, future.result())
+            return
+        error = str(error) or type(error).__name__
+    write_later(fail_job, job_id, error)
+
+def save_parsed_job(job_id, parsed: ParsedJob):
+    """Saves a statement parsed in the pool and records the job's outcome."""
+    job = ParseJob.objects.get(id=job_id)
+    collector = timing.start()
+    error = parsed.error
+    if error is None:
+        try:
+            Midas(
+                job.pdf,
+                statement=MidasStatement.from_dict(parsed.statement),
+                sha256=parsed.sha256,
+                cached=parsed.cached,
+            )
+        except Exception as e:
+            error = str(e)
+    timings = parsed.timings.copy()
+    for name, seconds in timing.finish(collector).items():
+        timings[name] = timings.get(name, 0.0) + seconds
+    # Recorded here, since the worker process has a timing.stats of its own.
+    timing.stats.record(finish_job(job, error, timings))
+
+def fail_job(job_id, error):
+    """Fails a pooled job that never got to report back."""
+    ParseJob.objects.filter(id=job_id, status__in=[ParseJob.QUEUED, ParseJob.RUNNING]).update(
+        status=ParseJob.FAILED, error=error, updated_at=timezone.now(),
+    )
+    logger.error("Parse job %s failed in the pool: %s", job_id, error, extra={'job_id': job_id})
+
+def stale_jobs(older_than):
+    """Jobs still queued or running that have not been updated since `older_than`."""
+    return ParseJob.objects.filter(status__in=[ParseJob.QUEUED, ParseJob.RUNNING], updated_at__lt=older_than)
+
+def run_parse_job(job_id):
+    """Parses and saves the job's statement in this process; returns its stage timings."""
+    job = ParseJob.objects.get(id=job_id)
+    job.status = ParseJob.RUNNING
+    job.save(update_fields=['status', 'updated_at'])
+    collector = timing.start()
+    try:
+        check_pdf(job.pdf_id)
+    except Exception as e:
+        error = str(e)
+    else:
+        error = None
+    return finish_job(job, error, timing.finish(collector))
+
+def finish_job(job, error, timings):
+    """Records the outcome of a job and returns its timings."""
+    if error is None:
+        job.status = ParseJob.DONE
+    else:
+        job.status = ParseJob.FAILED
+        job.error = error
+    job.timings = timings
+    job.save(update_fields=['status', 'error', 'timings', 'updated_at'])
+    timing.log(f"parse job {job.id} {job.status}", job.timings, job_id=job.id, status=job.status)
+    return job.timings
+
+def checked_pdf(pdf_id) -> CalculatorPDF:
+    pdf = CalculatorPDF.objects.get(id=pdf_id)
+    if not pdf.pdf.name.endswith('.pdf'):
+        raise ValueError("Invalid PDF file")
+    return pdf
+
+def check_pdf(pdf_id):
+    pdf = checked_pdf(pdf_id)
+    # Initialize Midas to process the PDF (this extracts info and transactions).
+    midas_instance = Midas(pdf)
+    logger.info("PDF %s processed; portfolio_date: %s", pdf_id, midas_instance.portfolio_date)
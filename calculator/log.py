@@ -0,0 +1,140 @@
+"""
+Logging helpers used by the LOGGING setting.
+
+QueueFileHandler hands records to a listener thread that writes them to a
+rotating file and echoes warnings to the console, so the thread that logs
+never waits on disk or stderr. Parse pool workers send their records to the
+parent's listener, so there is one file. The queue is bounded; when it is
+full records are dropped (and counted) rather than blocking. SampleFilter
+thins out records below WARNING.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import random
+
+# Set by workers.init_worker in pool workers: the queue of the parent's
+# QueueFileHandler, which the worker's handler forwards to.
+parent_queue = None
+
+# The queue of this process's listening QueueFileHandler, for process_pool
+# to hand to its workers.
+listener_queue = None
+
+# Attributes every LogRecord has; anything else was passed through `extra`.
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+# Formats tracebacks for the console the way an unconfigured handler would.
+PLAIN = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra` fields."""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.process,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Passes WARNING and above; lower levels with probability `rate`."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class QueueFileHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler with its own listener thread, RotatingFileHandler and
+    stderr StreamHandler for records at or above console_level.
+
+    Records are formatted in the logging thread (so `extra` values are
+    captured as they were) and written by the listener. The queue is a
+    multiprocessing queue: pool workers and forked children put their
+    records on it instead of starting listeners of their own, so only one
+    process ever writes (and rolls over) the file.
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, backup_count=5, queue_size=10000,
+                 console_level=logging.WARNING):
+        self.dropped = 0
+        self.listener = None
+        if parent_queue is not None:
+            super().__init__(parent_queue)
+            return
+        super().__init__(multiprocessing.get_context("spawn").Queue(maxsize=queue_size))
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        self.file = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True,
+        )
+        self.file.setFormatter(logging.Formatter('%(formatted)s'))
+        self.console = logging.StreamHandler()
+        self.console.setLevel(console_level)
+        self.listener = logging.handlers.QueueListener(self.queue, self.file, self.console,
+                                                       respect_handler_level=True)
+        self.listener.start()
+        global listener_queue
+        listener_queue = self.queue
+        atexit.register(self.close)
+        # A forked child keeps the queue but not the listener thread.
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def after_fork(self):
+        self.queue._after_fork()
+        self.listener = None
+        self.dropped = 0
+
+    def prepare(self, record):
+        """
+        Returns a plain copy of record that pickles: its message, its JSON
+        line for the file and any traceback as text for the console.
+        """
+        return logging.makeLogRecord({
+            'name': record.name, 'levelno': record.levelno, 'levelname': record.levelname,
+            'created': record.created, 'msecs': record.msecs, 'process': record.process,
+            'msg': record.getMessage(), 'formatted': self.format(record),
+            'exc_text': PLAIN.formatException(record.exc_info) if record.exc_info else record.exc_text,
+        })
+
+    def enqueue(self, record):
+        try:
+            if self.dropped:
+                notice = logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': f"{self.dropped} log records dropped, the log queue was full",
+                })
+                self.queue.put_nowait(self.prepare(notice))
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.listener is not None:
+            try:
+                self.listener.stop()
+            except queue.Full:
+                pass
+            self.listener = None
+            self.file.close()
+            self.console.close()
+        super().close()
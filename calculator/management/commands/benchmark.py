@@ -0,0 +1,175 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from pypdf import PdfReader
+
+from calculator.extraction import iter_page_texts
+from calculator.midas import Midas
+from calculator.models import Calculator, CalculatorPDF, CalculationResult, LotCheckpoint
+from calculator.statement import parse_statement
+from calculator.synthetic import DEFAULT_SYMBOLS, generate_statements
+from calculator.views import calculate_results, calculate_tax
+
+STAGES = ['extract', 'parse', 'persist', 'calculate_results', 'calculate_results_resume',
+          'calculate_tax', 'results_view', 'results_view_cached']
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the statement pipeline on synthetic statements: extraction, "
+        "parsing, persistence, calculate_results, calculate_tax and the results "
+        "view. Runs against a throwaway database; results can be saved as JSON "
+        "and compared with an earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=12)
+        parser.add_argument('--symbols', type=int, default=len(DEFAULT_SYMBOLS), help="Number of symbols traded.")
+        parser.add_argument('--trades', type=int, default=40, help="Trades per month.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per stage; min and median are reported.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--compare', help="Compare with the results in this JSON file.")
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help="Relative slowdown of the median reported as a regression (default 0.10).")
+
+    def handle(self, *args, **options):
+        symbols = list(DEFAULT_SYMBOLS) + [f"SYM{i}" for i in range(len(DEFAULT_SYMBOLS), options['symbols'])]
+        symbols = symbols[:options['symbols']]
+        repeat = max(options['repeat'], 1)
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = generate_statements(os.path.join(directory, 'statements'), months=options['months'],
+                                        symbols=symbols, trades=options['trades'], seed=options['seed'])
+            old_name = connection.settings_dict['NAME']
+            old_test = connection.settings_dict['TEST']
+            # Nothing may touch the configured database: drop any connection
+            # to it and create the throwaway one inside the temporary directory.
+            connection.close()
+            if connection.vendor == 'sqlite':
+                connection.settings_dict['TEST'] = {**old_test, 'NAME': os.path.join(directory, 'benchmark.sqlite3')}
+            setup_test_environment()
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                with override_settings(MEDIA_ROOT=os.path.join(directory, 'media'), CALCULATOR_PARSE_WORKERS=0):
+                    timings = self.run_stages(paths, repeat)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                connection.settings_dict['TEST'] = old_test
+                teardown_test_environment()
+
+        results = {
+            'meta': {
+                'revision': git_revision(),
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'months': options['months'],
+                'symbols': len(symbols),
+                'trades': options['trades'],
+                'repeat': repeat,
+                'seed': options['seed'],
+            },
+            'stages': {
+                stage: {'min': min(runs), 'median': statistics.median(runs), 'runs': runs}
+                for stage, runs in timings.items()
+            },
+        }
+        self.report(results, previous, options['threshold'])
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def run_stages(self, paths, repeat):
+        timings = {stage: [] for stage in STAGES}
+
+        def timed(stage, function, *args, **kwargs):
+            with contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                value = function(*args, **kwargs)
+                timings[stage].append(time.perf_counter() - started)
+            return value
+
+        def extract():
+            return [
+                [line.strip() for page_text in iter_page_texts(PdfReader(path, strict=True), path,
+                                                                 workers=settings.MIDAS_EXTRACT_WORKERS,
+                                                                 min_pages=settings.MIDAS_EXTRACT_MIN_PAGES)
+                 for line in page_text.split("\n")]
+                for path in paths
+            ]
+
+        def persist(calculator, statements):
+            for path, statement in zip(paths, statements):
+                with open(path, 'rb') as f:
+                    pdf_object = CalculatorPDF.objects.create(calculator=calculator, pdf=File(f, name=os.path.basename(path)))
+                Midas(pdf_object, statement=statement)
+
+        client = Client()
+        for _ in range(repeat):
+            lines = timed('extract', extract)
+            statements = timed('parse', lambda: [parse_statement(statement_lines, source=path)
+                                                 for path, statement_lines in zip(paths, lines)])
+            calculator = Calculator.objects.create(name="benchmark")
+            timed('persist', persist, calculator, statements)
+            context = timed('calculate_results', calculate_results, calculator.id, use_checkpoints=False)
+            # The full run above stored lot checkpoints; this one resumes from them.
+            timed('calculate_results_resume', calculate_results, calculator.id)
+            timed('calculate_tax', lambda: [calculate_tax(context['profit'] * i / 100) for i in range(1000)])
+
+            # Cold view first (nothing stored), then served from CalculationResult.
+            CalculationResult.objects.filter(calculator=calculator).delete()
+            LotCheckpoint.objects.filter(calculator=calculator).delete()
+            for stage in ['results_view', 'results_view_cached']:
+                response = timed(stage, client.post, '/calculator/results/',
+                                 data=json.dumps({'calculator_id': calculator.id}), content_type='application/json')
+                if response.status_code != 200:
+                    raise CommandError(f"Results view returned {response.status_code}")
+        return timings
+
+    def report(self, results, previous, threshold):
+        meta = results['meta']
+        self.stdout.write(f"{meta['months']} months x {meta['trades']} trades, {meta['symbols']} symbols, "
+                          f"{meta['repeat']} runs (revision {meta['revision']})")
+        if previous:
+            workload = ['months', 'trades', 'symbols']
+            if any(previous['meta'].get(key) != meta[key] for key in workload):
+                self.stdout.write(self.style.WARNING("The compared run used a different workload"))
+        regressions = []
+        for stage, timing in results['stages'].items():
+            line = f"{stage:<26} min {timing['min'] * 1000:9.2f} ms  median {timing['median'] * 1000:9.2f} ms"
+            before = previous and previous['stages'].get(stage)
+            if before:
+                change = timing['median'] / before['median'] - 1 if before['median'] else 0
+                line += f"  {change:+.1%} vs {previous['meta'].get('revision')}"
+                if change > threshold:
+                    regressions.append(stage)
+            self.stdout.write(line)
+        if regressions:
+            self.stdout.write(self.style.WARNING(f"Slower than before: {', '.join(regressions)}"))
@@ -0,0 +1,186 @@
+import os
+import tempfile
+import time
+import zipfile
+from datetime import timezone
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from pypdf import PdfReader
+
+from calculator.extraction import iter_page_texts
+from calculator.midas import Midas, file_sha256
+from calculator.models import Calculator, CalculatorPDF, ParsedStatement
+from calculator.statement import PARSER_VERSION, MidasStatement, parse_statement
+from calculator.workers import process_pool
+
+# Keeps `IN (...)` lookups under SQLite's bound-parameter limit.
+QUERY_CHUNK = 500
+
+
+def parse_file(path):
+    """Pool task: returns (path, MidasStatement.to_dict(), error)."""
+    try:
+        reader = PdfReader(path, strict=True)
+        lines = (line.strip() for page_text in iter_page_texts(reader, path) for line in page_text.split("\n"))
+        statement = parse_statement(lines, source=path)
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+    return path, statement.to_dict(), None
+
+
+def chunks(items, size=QUERY_CHUNK):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = (
+        "Ingest a directory or .zip archive of Midas statements. Files are "
+        "grouped into calculators by TCKN, parsed across a process pool and "
+        "written in batches. Files that were already ingested are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="Directory (searched recursively) or .zip archive of PDFs.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="Size of the parsing process pool; 0 parses in this process.")
+        parser.add_argument('--batch-size', type=int, default=25,
+                            help="Statements written per database transaction.")
+
+    def handle(self, *args, **options):
+        source = options['source']
+        self.timings = {}
+        if os.path.isdir(source):
+            self.ingest(self.find_pdfs(source), options)
+        elif zipfile.is_zipfile(source):
+            with tempfile.TemporaryDirectory() as directory:
+                with zipfile.ZipFile(source) as archive:
+                    archive.extractall(directory, [name for name in archive.namelist() if name.lower().endswith('.pdf')])
+                self.ingest(self.find_pdfs(directory), options)
+        else:
+            raise CommandError(f"{source} is neither a directory nor a zip archive")
+
+    def find_pdfs(self, directory):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(directory)
+            for name in names if name.lower().endswith('.pdf')
+        )
+
+    def stage(self, name, started):
+        self.timings[name] = time.monotonic() - started
+
+    def ingest(self, paths, options):
+        failures = []
+
+        # 1. Hash files; skip those already ingested or repeated in the input.
+        started = time.monotonic()
+        hashes = {}
+        for path in paths:
+            hashes.setdefault(file_sha256(path), path)
+        ingested = set()
+        for batch in chunks(hashes):
+            ingested.update(CalculatorPDF.objects.filter(sha256__in=batch).values_list('sha256', flat=True))
+        pending = {sha256: path for sha256, path in hashes.items() if sha256 not in ingested}
+        self.stage('hash', started)
+        self.stdout.write(f"{len(paths)} files, {len(paths) - len(hashes)} repeated, "
+                          f"{len(ingested)} already ingested, {len(pending)} to ingest")
+
+        # 2. Parse, reusing cached statements and filling the cache with new ones.
+        started = time.monotonic()
+        statements = {}
+        cached = ParsedStatement.objects.filter(parser_version=PARSER_VERSION)
+        for batch in chunks(pending):
+            for sha256, data in cached.filter(sha256__in=batch).values_list('sha256', 'data'):
+                statements[sha256] = MidasStatement.from_dict(data)
+        to_parse = {path: sha256 for sha256, path in pending.items() if sha256 not in statements}
+        if options['workers'] > 0 and len(to_parse) > 1:
+            with process_pool(min(options['workers'], len(to_parse))) as executor:
+                outcomes = executor.map(parse_file, to_parse)
+                parsed = self.collect(outcomes, to_parse, statements, failures)
+        else:
+            parsed = self.collect(map(parse_file, to_parse), to_parse, statements, failures)
+        ParsedStatement.objects.bulk_create(
+            [ParsedStatement(sha256=sha256, parser_version=PARSER_VERSION, data=data, misses=1) for sha256, data in parsed],
+            ignore_conflicts=True,
+        )
+        self.stage('parse', started)
+        self.stdout.write(f"Parsed {len(parsed)} statements, {len(statements) - len(parsed)} from cache")
+
+        # 3. Group by TCKN, reusing existing calculators.
+        started = time.monotonic()
+        by_tckn = {}
+        for sha256, statement in statements.items():
+            if "tckn" not in statement.account_info:
+                failures.append((pending[sha256], "ValueError: No TCKN found in the statement."))
+                continue
+            by_tckn.setdefault(int(statement.account_info["tckn"]), []).append(sha256)
+        calculators = {}
+        for batch in chunks(by_tckn):
+            for calculator in Calculator.objects.filter(tckn__in=batch).order_by('-id'):
+                calculators[calculator.tckn] = calculator
+        for tckn, sha256s in by_tckn.items():
+            if tckn not in calculators:
+                account_info = statements[sha256s[0]].account_info
+                opening_dates = account_info.get("account_opening_date")
+                calculators[tckn] = Calculator.objects.create(
+                    name="default_calculator",
+                    customer_name=account_info.get("customer_name"),
+                    tckn=tckn,
+                    account_opening_date=opening_dates[0].astimezone(timezone.utc) if opening_dates else None,
+                )
+        self.stage('group', started)
+        self.stdout.write(f"{len(by_tckn)} calculators")
+
+        # 4. Persist month by month per calculator, batch_size statements per transaction.
+        started = time.monotonic()
+        queue = [
+            (calculators[tckn], sha256)
+            for tckn, sha256s in by_tckn.items()
+            for sha256 in sorted(sha256s, key=lambda sha256: statements[sha256].portfolio_date)
+        ]
+        written = 0
+        batch_size = max(options['batch_size'], 1)
+        for batch in chunks(queue, batch_size):
+            with transaction.atomic():
+                for calculator, sha256 in batch:
+                    if self.persist(calculator, sha256, pending[sha256], statements[sha256], failures):
+                        written += 1
+            self.stdout.write(f"{written}/{len(queue)} statements written")
+        self.stage('persist', started)
+
+        self.stdout.write(self.style.SUCCESS(f"Ingested {written} statements into {len(by_tckn)} calculators"))
+        self.stdout.write("Timings: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.timings.items()))
+        for path, error in failures:
+            self.stderr.write(f"{path}: {error}")
+        if failures:
+            raise CommandError(f"{len(failures)} files failed")
+
+    def collect(self, outcomes, to_parse, statements, failures):
+        parsed = []
+        for done, (path, data, error) in enumerate(outcomes, 1):
+            if error is not None:
+                failures.append((path, error))
+            else:
+                statements[to_parse[path]] = MidasStatement.from_dict(data)
+                parsed.append((to_parse[path], data))
+            if done % 50 == 0:
+                self.stdout.write(f"{done}/{len(to_parse)} parsed")
+        return parsed
+
+    def persist(self, calculator, sha256, path, statement, failures):
+        pdf_object = None
+        try:
+            with transaction.atomic():
+                with open(path, 'rb') as f:
+                    pdf_object = CalculatorPDF.objects.create(calculator=calculator, pdf=File(f, name=os.path.basename(path)))
+                Midas(pdf_object, statement=statement, sha256=sha256)
+        except Exception as e:
+            if pdf_object is not None:
+                pdf_object.pdf.delete(save=False)
+            failures.append((path, f"{type(e).__name__}: {e}"))
+            return False
+        return True
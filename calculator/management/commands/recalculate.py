@@ -0,0 +1,107 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from calculator.models import Calculator, CalculationResult
+from calculator.views import compute_calculation, results_fingerprints
+from calculator.workers import process_pool
+
+
+def recalculate(calculator_id):
+    """Pool task: returns (calculator_id, fingerprint, data, error)."""
+    try:
+        fingerprint, data = compute_calculation(calculator_id)
+    except Exception as e:
+        return calculator_id, None, None, f"{type(e).__name__}: {e}"
+    return calculator_id, fingerprint, data, None
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute stored results for every calculator, or only the given IDs, "
+        "across a process pool. Calculators whose stored result is already up "
+        "to date are skipped, so an interrupted run can simply be restarted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('calculator_ids', nargs='*', type=int, help="Only recompute these calculators.")
+        parser.add_argument('--paid', action='store_true', help="Only recompute paid calculators.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="Size of the process pool; 0 runs in this process.")
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help="Calculators per batch; results are written back once per batch.")
+        parser.add_argument('--force', action='store_true', help="Recompute results that are already up to date.")
+
+    def handle(self, *args, **options):
+        calculators = Calculator.objects.order_by('id')
+        if options['calculator_ids']:
+            calculators = calculators.filter(id__in=options['calculator_ids'])
+        if options['paid']:
+            calculators = calculators.filter(is_paid=True)
+        calculator_ids = list(calculators.values_list('id', flat=True))
+        batch_size = max(options['batch_size'], 1)
+        workers = options['workers']
+
+        self.done = self.skipped = 0
+        self.failures = []
+        self.mismatches = {}
+        started = time.monotonic()
+        executor = process_pool(workers) if workers > 0 else None
+        try:
+            for start in range(0, len(calculator_ids), batch_size):
+                self.run_batch(calculator_ids[start:start + batch_size], executor, options['force'])
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{min(start + batch_size, len(calculator_ids))}/{len(calculator_ids)} calculators - {self.done / elapsed if elapsed else 0:.1f}/s, "
+                    f"{self.skipped} up to date, {len(self.failures)} failed"
+                )
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Recalculated {self.done} calculators in {elapsed:.1f}s "
+            f"({self.done / elapsed if elapsed else 0:.1f}/s); {self.skipped} already up to date."
+        ))
+        for calculator_id, rows in self.mismatches.items():
+            for symbol, date, calculated, reported in rows:
+                self.stdout.write(self.style.WARNING(
+                    f"Calculator {calculator_id}: {symbol} on {date[:10]} calculated {calculated}, statement shows {reported}"
+                ))
+        for calculator_id, error in self.failures:
+            self.stderr.write(f"Calculator {calculator_id} failed: {error}")
+        if self.failures:
+            raise CommandError(f"{len(self.failures)} calculators failed")
+
+    def run_batch(self, calculator_ids, executor, force):
+        fingerprints = results_fingerprints(calculator_ids)
+        if not force:
+            current = set(CalculationResult.objects.filter(calculator_id__in=calculator_ids)
+                          .values_list('calculator_id', 'fingerprint'))
+            pending = [calculator_id for calculator_id in calculator_ids
+                       if (calculator_id, fingerprints[calculator_id]) not in current]
+            self.skipped += len(calculator_ids) - len(pending)
+        else:
+            pending = calculator_ids
+
+        if executor is not None:
+            outcomes = executor.map(recalculate, pending)
+        else:
+            outcomes = map(recalculate, pending)
+        results = []
+        for calculator_id, fingerprint, data, error in outcomes:
+            if error is not None:
+                self.failures.append((calculator_id, error))
+                continue
+            if data['portfolio_mismatches']:
+                self.mismatches[calculator_id] = data['portfolio_mismatches']
+            results.append(CalculationResult(calculator_id=calculator_id, fingerprint=fingerprint, data=data))
+
+        # Django 4.0 has no bulk upsert, so replace the batch's rows in one go.
+        with transaction.atomic():
+            CalculationResult.objects.filter(calculator_id__in=[result.calculator_id for result in results]).delete()
+            CalculationResult.objects.bulk_create(results)
+        self.done += len(results)
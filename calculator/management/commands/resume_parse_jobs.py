@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from calculator.jobs import run_parse_job, stale_jobs
+from calculator.models import ParseJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-run parse jobs left queued or running by a restart or a crashed "
+        "worker. Only jobs not updated for --stale-minutes are touched, so "
+        "jobs still in progress elsewhere are left alone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-minutes', type=float, default=10,
+                            help="Minutes since a job's last update before it counts as stale; 0 takes all.")
+        parser.add_argument('--fail', action='store_true', help="Mark stale jobs as failed instead of re-running them.")
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(minutes=options['stale_minutes'])
+        job_ids = list(stale_jobs(older_than).order_by('id').values_list('id', flat=True))
+        if options['fail']:
+            failed = stale_jobs(older_than).filter(id__in=job_ids).update(
+                status=ParseJob.FAILED, error="Parse job was interrupted", updated_at=timezone.now(),
+            )
+            self.stdout.write(self.style.SUCCESS(f"Marked {failed} stale jobs as failed"))
+            return
+
+        for job_id in job_ids:
+            run_parse_job(job_id)
+        statuses = dict(ParseJob.objects.filter(id__in=job_ids).values_list('id', 'status'))
+        done = sum(status == ParseJob.DONE for status in statuses.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-ran {len(job_ids)} stale jobs: {done} done, {len(job_ids) - done} failed"
+        ))
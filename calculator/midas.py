@@ -1,385 +1,545 @@
-import re
 import json
-import time
-from datetime import datetime, timedelta, timezone
+import hashlib
+import logging
+from collections import deque, namedtuple
+from datetime import datetime, timezone
 from decimal import Decimal
 
-from django.db import transaction, OperationalError, IntegrityError
-from .models import Calculator, CalculatorPDF, Transaction, Portfolio
+from django.db import connection, transaction
+from django.db.models import Count, F, Min, Sum
+from .models import CalculatorPDF, Transaction, Portfolio, ParsedStatement
+from .extraction import iter_page_texts
+from .statement import PARSER_VERSION, MidasStatement, parse_statement
+from .timing import stage
+from .db import retry_locked, write
+from .pgcopy import copy_merge
 from pypdf import PdfReader
 
 from django.conf import settings
 import os
 
-def parse_number(text):
-    """Convert a string number with comma as decimal separator to Decimal."""
-    try:
-        if isinstance(text, str):
-            # Remove thousand separators if both '.' and ',' exist.
-            if '.' in text and ',' in text:
-                text = text.replace('.', '')
-            text = text.replace(',', '.')
-        return Decimal(text)
-    except (ValueError, AttributeError):
-        return None
-
-def atomic_get_or_create(model, defaults, **kwargs):
+logger = logging.getLogger(__name__)
+
+PersistResult = namedtuple('PersistResult', ['inserted', 'skipped'])
+
+def bulk_insert_transactions(pdf_object: CalculatorPDF, transactions: list) -> PersistResult:
     """
-    Attempts to get or create an object inside an atomic transaction.
-    Retries a few times if an OperationalError occurs (e.g. "database is locked").
+    Inserts all of a statement's transactions in one atomic batch.
+    Rows clashing with an existing row on the unique key are skipped
+    instead of failing the batch. On PostgreSQL the rows are loaded with
+    COPY (see pgcopy.py).
     """
-    retries = 5
-    delay = 0.5  # initial delay in seconds
-    while retries > 0:
-        try:
-            with transaction.atomic():
-                obj, created = model.objects.get_or_create(defaults=defaults, **kwargs)
-            return obj, created
-        except OperationalError as e:
-            if "database is locked" in str(e):
-                retries -= 1
-                time.sleep(delay)
-                delay *= 2  # exponential backoff
-            else:
-                raise
-    raise OperationalError("Operation failed after multiple retries due to a locked database.")
+    if connection.vendor == 'postgresql':
+        inserted = copy_merge(Transaction, transactions, key=Transaction._meta.unique_together[0])
+        return PersistResult(inserted, len(transactions) - inserted)
+    with transaction.atomic():
+        existing = Transaction.objects.filter(pdf=pdf_object).count()
+        Transaction.objects.bulk_create(transactions, ignore_conflicts=True)
+        inserted = Transaction.objects.filter(pdf=pdf_object).count() - existing
+    return PersistResult(inserted, len(transactions) - inserted)
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_cached_statement(sha256: str):
+    """
+    Returns the cached MidasStatement for a file hash, or None on a miss.
+    Statements cached by another PARSER_VERSION are misses. Only reads;
+    record_statement() counts the hit.
+    """
+    data = (ParsedStatement.objects.filter(sha256=sha256, parser_version=PARSER_VERSION)
+            .values_list('data', flat=True).first())
+    return None if data is None else MidasStatement.from_dict(data)
+
+def record_statement(sha256: str, statement: MidasStatement, cached: bool):
+    """Counts a statement cache hit, or stores a statement parsed on a miss."""
+    if cached:
+        (ParsedStatement.objects.filter(sha256=sha256, parser_version=PARSER_VERSION)
+         .update(hits=F('hits') + 1))
+        return
+    cached, created = ParsedStatement.objects.get_or_create(
+        sha256=sha256,
+        parser_version=PARSER_VERSION,
+        defaults={'data': statement.to_dict(), 'misses': 1},
+    )
+    if not created:
+        # Another upload of the same file was parsed at the same time.
+        ParsedStatement.objects.filter(id=cached.id).update(misses=F('misses') + 1)
+
+def statement_cache_stats() -> dict:
+    """Entries, hits and misses of the statement cache for PARSER_VERSION."""
+    stats = (ParsedStatement.objects.filter(parser_version=PARSER_VERSION)
+             .aggregate(entries=Count('id'), hits=Sum('hits'), misses=Sum('misses')))
+    return {key: value or 0 for key, value in stats.items()}
+
+def cleanup_duplicates(calculator_id) -> int:
+    """
+    Deletes transactions repeated across a calculator's PDFs, keeping the
+    lowest id per (date, symbol, type, price, quantity), in one DELETE.
+    Returns the number of rows removed.
+    """
+    transactions = Transaction.objects.filter(pdf__calculator_id=calculator_id)
+    keep_ids = (transactions
+                .values('date', 'symbol', 'transaction_type', 'price', 'quantity')
+                .annotate(keep_id=Min('id'))
+                .values('keep_id'))
+    removed, _ = transactions.exclude(id__in=keep_ids).delete()
+    return removed
 
 class Midas:
-    def __init__(self, pdf_object: CalculatorPDF):
+    def __init__(self, pdf_object: CalculatorPDF, statement: MidasStatement = None, sha256: str = None,
+                 cached: bool = None, save: bool = True):
+        # statement can be passed in when the file was already parsed
+        # elsewhere (by the ingest_statements command's or the parse pool's
+        # workers), with the file's sha256 and whether it came from the
+        # statement cache; cached=None leaves the cache to the caller.
+        # save=False only reads the statement and never writes.
         self.pdf_object = pdf_object
         self.path = pdf_object.pdf.path
-        self.reader = PdfReader(self.path, strict=True)
-        self.text = "\n".join([page.extract_text() for page in self.reader.pages])
-        self.lines = [line.strip() for line in self.text.split("\n")]
+        if sha256 is None:
+            with stage("file_hash"):
+                sha256 = file_sha256(self.path)
+        self.sha256 = sha256
+        self.lines = []
+        self.cached = cached
+        self.statement = statement if statement is not None else self.load_statement()
 
-        if not self.is_valid():
-            raise ValueError(
-                f"{self.path} is not a valid Midas account statement. "
-                "The strings 'Midas Menkul Değerler A.Ş.' or 'HESAP EKSTRESİ' were not found in the statement."
-            )
+        self.statement_dates = self.statement.statement_dates
+        self.account_info = self.statement.account_info
+        self.portfolio_date = self.statement.portfolio_date
+
+        # Ingestion writes are serialized on the writer thread (calculator/db.py);
+        # time spent queued behind other statements shows up as write_wait.
+        # Other processes (web workers, commands) can still hold the lock.
+        if save:
+            with stage("write_wait"):
+                write(retry_locked, self.save)
+
+    def save(self):
+        # The statement lands as one unit: cache entry, portfolio snapshot,
+        # transactions and the PDF's account info are committed together or
+        # not at all.
+        with transaction.atomic(), stage("db_write"):
+            if self.cached is not None:
+                with stage("statement_cache"):
+                    record_statement(self.sha256, self.statement, self.cached)
+            self.save_portfolio()
+            self.sorted_transactions = self.extract_transactions()
+            with stage("duplicate_cleanup"):
+                self.pdf_object.duplicates_removed = cleanup_duplicates(self.pdf_object.calculator_id)
+
+            # Save extracted info to the PDF object.
+            self.pdf_object.account_opening_date = self.account_info.get("account_opening_date")[0].astimezone(timezone.utc)
+            self.pdf_object.customer_name = self.account_info.get("customer_name")
+            self.pdf_object.tckn = int(self.account_info.get("tckn"))
+            self.pdf_object.portfolio_date = self.portfolio_date.astimezone(timezone.utc)
+            self.pdf_object.sha256 = self.sha256
+            self.pdf_object.save()
 
-        self.statement_dates = self.extract_statement_dates()
-        self.account_info = self.extract_account_info()
-        self.portfolio_date = self.extract_portfolio_summary_get_portfolio_date()
-        self.sorted_transactions = self.extract_transactions()
-
-        # Save extracted info to the PDF object.
-        self.pdf_object.account_opening_date = self.account_info.get("account_opening_date")[0].astimezone(timezone.utc)
-        self.pdf_object.customer_name = self.account_info.get("customer_name")
-        self.pdf_object.tckn = int(self.account_info.get("tckn"))
-        self.pdf_object.portfolio_date = self.portfolio_date.astimezone(timezone.utc)
-        self.pdf_object.save()
-    
-    def is_valid(self) -> bool:
+    def load_statement(self) -> MidasStatement:
+        # Re-uploads of a file we have already parsed skip pypdf entirely.
+        with stage("statement_cache"):
+            statement = load_cached_statement(self.sha256)
+        self.cached = statement is not None
+        if statement is not None:
+            logger.info("Statement cache hit for %s", self.path)
+            return statement
+        with stage("pdf_extract"):
+            self.reader = PdfReader(self.path, strict=True)
+        # Lines are parsed as pages come out of extraction.
+        with stage("statement_parse"):
+            statement = parse_statement(self.iter_lines(), source=self.path)
+        self.check_metadata()
+        return statement
+
+    def iter_lines(self):
+        page_texts = iter_page_texts(
+            self.reader,
+            self.path,
+            workers=settings.MIDAS_EXTRACT_WORKERS,
+            min_pages=settings.MIDAS_EXTRACT_MIN_PAGES,
+        )
+        while True:
+            # Extraction is timed apart from the parsing that consumes it.
+            with stage("pdf_extract"):
+                page_text = next(page_texts, None)
+            if page_text is None:
+                break
+            for line in page_text.split("\n"):
+                line = line.strip()
+                self.lines.append(line)
+                yield line
+
+    def check_metadata(self):
         # Optional: log a warning if metadata.title isn’t as expected.
         if self.reader.metadata.title != "Hesap Ekstresi":
-            print(f"Warning: metadata.title is not 'Hesap Ekstresi' for {self.path}")
-        return "Midas Menkul Değerler A.Ş." in self.text and "HESAP EKSTRESİ" in self.text
-
-    def extract_dates_from_text(self, text: str) -> list:
-        dates = re.findall(r"\d{2}/\d{2}/\d{2}", text)
-        return [datetime.strptime(date, "%d/%m/%y") for date in dates]
-    
-    def extract_statement_dates(self) -> list:
-        for line in self.lines:
-            if "HESAP EKSTRESİ" in line:
-                statement_dates = sorted(self.extract_dates_from_text(line))
-                if len(statement_dates) != 2:
-                    raise ValueError(f"Invalid number of statement dates found: {len(statement_dates)}")
-                # Check if dates represent the first and last day of the month.
-                if (statement_dates[0].day != 1 or 
-                    statement_dates[1].month == (statement_dates[1] + timedelta(days=1)).month):
-                    raise ValueError("The statement dates are not the first and last day of the month.")
-                return statement_dates
-        raise ValueError("No statement dates were found in the statement.")
-    
-    def extract_account_info(self) -> dict:
-        account_info = {}
-        for line in self.lines:
-            if "PORTFÖY ÖZETİ" in line and not account_info:
-                raise ValueError("Account info not found in the statement.")
-            elif "PORTFÖY ÖZETİ" in line and account_info:
-                break
-            if "Müşteri Adı" in line:
-                account_info["customer_name"] = line.split(":")[1].strip()
-            elif "TCKN" in line:
-                tckn_match = re.search(r'\b\d{11}\b', line)
-                if tckn_match:
-                    account_info["tckn"] = tckn_match.group()
-                else:
-                    raise ValueError(f"Could not find valid TCKN in line: {line}")
-            elif "Hesap Açılış" in line:
-                account_info["account_opening_date"] = self.extract_dates_from_text(line)
-        return account_info
-    
-    def extract_portfolio_summary_get_portfolio_date(self):
-        portfolio_bool = False
-        portfolio_date = None
-        for line in self.lines:
-            if "PORTFÖY ÖZETİ" in line:
-                portfolio_bool = True
-                portfolio_date_list = self.extract_dates_from_text(line)
-                if len(portfolio_date_list) != 1:
-                    raise ValueError(f"Invalid number of portfolio dates found: {len(portfolio_date_list)}")
-                portfolio_date = portfolio_date_list[0]
-            if "YATIRIM İŞLEMLERİ" in line:
-                portfolio_bool = False
-            if portfolio_bool and "USD" in line:
-                split = line.split()
-                portfolio_symbol = split[0]
-                quantity = parse_number(split[-7])
-                buy_price = parse_number(split[-6])
-                profit = parse_number(split[-4])
-                portfolio_object = Portfolio(pdf=self.pdf_object)
-                portfolio_object.date = portfolio_date.astimezone(timezone.utc)
-                portfolio_object.symbol = portfolio_symbol
-                portfolio_object.quantity = quantity
-                portfolio_object.buy_price = buy_price
-                portfolio_object.profit = profit
-                portfolio_object.save()
-        if portfolio_date is None:
-            raise ValueError("No portfolio date found in the statement.")
-        return portfolio_date
-    
-    def parse_transaction_line(self, line) -> Transaction:
-        """Return an unsaved Transaction instance from a transaction line."""
-        parts = line.strip().split()
-        if len(parts) < 10:
-            return None
-        try:
-            date_str = f"{parts[0]} {parts[1]}"
-            transaction_date = datetime.strptime(date_str, '%d/%m/%y %H:%M:%S')
-            transaction_date = transaction_date.replace(tzinfo=timezone.utc)
-            if parts[6] in ['İptal', 'Reddedildi', 'İptal Edildi']:
-                return None
-            transaction_quantity = parse_number(parts[-4])
-            transaction_price = parse_number(parts[-3])
-            transaction_fee = parse_number(parts[-2])
-            total_price = parse_number(parts[-1])
-            if None in [transaction_quantity, transaction_price, transaction_fee, total_price]:
-                return None
-            # Create and return a Transaction instance (do not save yet)
-            transaction_object = Transaction(
-                pdf=self.pdf_object,
-                date=transaction_date,
-                symbol=parts[4],
-                transaction_type=parts[5],
-                price=transaction_price,
-                quantity=transaction_quantity,
-                transaction_fee=transaction_fee,
-                total_amount=total_price,
-                transaction_status=parts[6],
-                transaction_currency=parts[7]
+            logger.warning("metadata.title is not 'Hesap Ekstresi' for %s", self.path)
+
+    def save_portfolio(self):
+        # One row per (date, symbol) and PDF on every backend: the first of
+        # the statement's rows, unless the PDF already has one.
+        portfolios = {}
+        for row in self.statement.portfolios:
+            portfolios.setdefault((row['date'], row['symbol']), Portfolio(pdf=self.pdf_object, **row))
+        portfolios = list(portfolios.values())
+        if connection.vendor == 'postgresql':
+            copy_merge(Portfolio, portfolios, key=('pdf', 'date', 'symbol'))
+        else:
+            stored = set(Portfolio.objects.filter(pdf=self.pdf_object).values_list('date', 'symbol'))
+            Portfolio.objects.bulk_create(
+                [portfolio for portfolio in portfolios if (portfolio.date, portfolio.symbol) not in stored]
             )
-            return transaction_object
-        except (IndexError, ValueError) as e:
-            print(f"Error parsing line: {line}\nDetails: {str(e)}")
-            return None
 
     def extract_transactions(self):
+        self.persist_result = PersistResult(0, 0)
         # Avoid reprocessing if transactions already exist for this PDF.
         if Transaction.objects.filter(pdf_id=self.pdf_object.id).exists():
-            print("Transactions for this PDF already exist, skipping extraction.")
+            logger.info("Transactions for PDF %s already exist, skipping extraction.", self.pdf_object.id)
             return Transaction.objects.filter(pdf_id=self.pdf_object.id).order_by('date')
         
         transactions = []
-        print(f"Processing file: {self.path}")
-        transactions_section = []
-        transaction_bool = False
-
-        # Extract lines belonging to the transaction section.
-        for line in self.lines:
-            if "YATIRIM İŞLEMLERİ" in line:
-                transaction_bool = True
-            if "HESAP İŞLEMLERİ" in line:
-                transaction_bool = False
-            if transaction_bool and "Tarih" not in line and "Gerçekleşti" in line:
-                transactions_section.append(line)
-
-        if transactions_section:
-            print(f"Found transactions section with {len(transactions_section)} lines")
+        logger.debug("Processing file: %s", self.path)
+
+        if self.statement.transactions:
+            logger.debug("Found %d transactions in %s", len(self.statement.transactions), self.path)
             seen_transactions = set()
-            for line in transactions_section:
-                if (line.strip() and not line.startswith('Tarih') and 
-                    not line.startswith('Kayıt') and not line.startswith('Adres:') and 
-                    len(line.split()) >= 10):
-                    transaction_obj = self.parse_transaction_line(line)
-                    if transaction_obj is None:
-                        continue
-                    # Define a signature for duplicate checking.
-                    signature = (
-                        transaction_obj.date,
-                        transaction_obj.symbol,
-                        transaction_obj.transaction_type,
-                        transaction_obj.price,
-                        transaction_obj.quantity
-                    )
-                    if signature in seen_transactions:
-                        print(f"Skipping duplicate transaction in current run: {transaction_obj}")
-                        continue
-                    seen_transactions.add(signature)
-                    
-                    try:
-                        # Use our atomic_get_or_create helper to safely insert the transaction.
-                        obj, created = atomic_get_or_create(
-                            Transaction,
-                            pdf=self.pdf_object,
-                            date=transaction_obj.date,
-                            symbol=transaction_obj.symbol,
-                            transaction_type=transaction_obj.transaction_type,
-                            price=transaction_obj.price,
-                            quantity=transaction_obj.quantity,
-                            defaults={
-                                'transaction_fee': transaction_obj.transaction_fee,
-                                'total_amount': transaction_obj.total_amount,
-                                'transaction_status': transaction_obj.transaction_status,
-                                'transaction_currency': transaction_obj.transaction_currency,
-                            }
-                        )
-                        if created:
-                            transactions.append(obj)
-                        else:
-                            print(f"Duplicate found via get_or_create: {obj}")
-                    except IntegrityError:
-                        print("IntegrityError: Duplicate transaction detected.")
-                        continue
+            duplicates = 0
+            for row in self.statement.transactions:
+                transaction_obj = Transaction(pdf=self.pdf_object, **row)
+                # Define a signature for duplicate checking.
+                signature = (
+                    transaction_obj.date,
+                    transaction_obj.symbol,
+                    transaction_obj.transaction_type,
+                    transaction_obj.price,
+                    transaction_obj.quantity
+                )
+                if signature in seen_transactions:
+                    logger.debug("Skipping duplicate transaction in current run: %s", transaction_obj)
+                    duplicates += 1
+                    continue
+                seen_transactions.add(signature)
+                
+                transactions.append(transaction_obj)
+
+            result = bulk_insert_transactions(self.pdf_object, transactions)
+            self.persist_result = PersistResult(result.inserted, result.skipped + duplicates)
+            logger.info(
+                "Inserted %d transactions, skipped %d duplicates for %s",
+                self.persist_result.inserted, self.persist_result.skipped, self.path,
+                extra={'pdf_id': self.pdf_object.id, 'inserted': self.persist_result.inserted,
+                       'skipped': self.persist_result.skipped},
+            )
         else:
-            print("No transaction lines found in PDF.")
-            with open("error_transaction.txt", "a") as f:
-                for line in self.lines:
-                    f.write(line + "\n")
-                f.write("No transaction lines found in this PDF.\n")
+            logger.warning("No transaction lines found in %s", self.path, extra={'pdf_id': self.pdf_object.id})
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Lines of %s without transactions", self.path, extra={'lines': self.lines})
         
         sorted_transactions = Transaction.objects.filter(pdf_id=self.pdf_object.id).order_by('date')
-        print(f"Returning sorted transactions with count: {sorted_transactions.count()}")
-        with open("transactions.txt", "a") as f:
-            f.write(f"Portfolio date: {self.portfolio_date}\n")
-            for t in sorted_transactions:
-                f.write(f"{t}\n")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Transactions of %s, portfolio date %s", self.path, self.portfolio_date,
+                extra={'pdf_id': self.pdf_object.id, 'transactions': [str(t) for t in sorted_transactions]},
+            )
         return sorted_transactions
 
 # --- UFE and Exchange Rate Functions ---
 
-with open(os.path.join(settings.BASE_DIR, "converted_ufe.json"), "r") as read_file:
+UFE_PATH = os.path.join(settings.BASE_DIR, "converted_ufe.json")
+RATES_PATH = os.path.join(settings.BASE_DIR, "exchange_rates_2020-2024.json")
+
+with open(UFE_PATH, "r") as read_file:
     ufe_data = json.load(read_file)
 
-with open(os.path.join(settings.BASE_DIR, "exchange_rates_2020-2024.json"), "r") as read_file:
+with open(RATES_PATH, "r") as read_file:
     rates = json.load(read_file)
 
+# Changes whenever either data file is corrected; part of the cache key of
+# stored calculation results.
+DATA_VERSION = hashlib.sha256(
+    "".join(file_sha256(path) for path in (UFE_PATH, RATES_PATH)).encode()
+).hexdigest()
+
+class RateTable:
+    """
+    USD/TRY rates addressable by ordinal date.
+
+    A transaction uses the rate published on the last business day before
+    it, so that lookup is resolved for every calendar day once, at load
+    time, and the Decimals are built once. The last published rate is
+    carried forward until the end of the following month; later dates are
+    an error, since the data file is out of date for them.
+    """
+
+    def __init__(self, rates: dict):
+        published = sorted(
+            (datetime.strptime(day, "%d-%m-%Y").toordinal(), Decimal(str(rate)))
+            for day, rate in rates.items()
+        )
+        self.first_day = published[0][0] + 1
+        last = datetime.fromordinal(published[-1][0])
+        # The day before the first of the second month after the last rate.
+        year, month = divmod(last.year * 12 + last.month + 1, 12)
+        self.last_day = datetime(year, month + 1, 1).toordinal() - 1
+        self.values = []
+        index = 0
+        for ordinal in range(self.first_day, self.last_day + 1):
+            while index < len(published) and published[index][0] < ordinal:
+                index += 1
+            self.values.append(published[index - 1][1])
+
+    def get(self, date: datetime) -> Decimal:
+        index = date.toordinal() - self.first_day
+        if not 0 <= index < len(self.values):
+            first = datetime.fromordinal(self.first_day)
+            last = datetime.fromordinal(self.last_day)
+            raise ValueError(
+                f"No exchange rate found for date {date.strftime('%d-%m-%Y')}; "
+                f"rates are available from {first.strftime('%d-%m-%Y')} to {last.strftime('%d-%m-%Y')}"
+            )
+        return self.values[index]
+
+rate_table = RateTable(rates)
+
 def get_rate(date: datetime):
-    formatted_date = date.strftime("%d-%m-%Y")
-    while date:
-        date -= timedelta(days=1)
-        formatted_date = date.strftime("%d-%m-%Y")
-        if formatted_date in rates:
-            return Decimal(str(rates[formatted_date]))
-    raise ValueError(f"No exchange rate found for date {formatted_date}")
+    return rate_table.get(date)
+
+class UfeTable:
+    """
+    UFE index values addressable by the (year, month) of a transaction.
+
+    Indexation uses the index of the month before the transaction, so the
+    shift is applied here once: the entry for (2024, 3) holds February 2024.
+    """
+
+    def __init__(self, ufe_data: list):
+        self.values = {}
+        for row in ufe_data:
+            year = int(row["Year"])
+            for month in range(1, 13):
+                key = (year, month + 1) if month < 12 else (year + 1, 1)
+                # The first row for a year wins, as in the old linear scan.
+                self.values.setdefault(key, Decimal(str(row[f"{month:02d}"])))
+
+    def get(self, month: int, year: int):
+        return self.values.get((year, month))
+
+    def indexation_ratios(self, date_pairs) -> list:
+        """
+        Returns sell_ufe / buy_ufe for each (buy_date, sell_date) pair,
+        resolving each distinct month once for the whole batch.
+        """
+        months = {}
+        ratios = []
+        for buy_date, sell_date in date_pairs:
+            buy_key = (buy_date.year, buy_date.month)
+            sell_key = (sell_date.year, sell_date.month)
+            for key in (buy_key, sell_key):
+                if key not in months:
+                    if key not in self.values:
+                        raise ValueError(f"No UFE index found for {key[1]:02d}/{key[0]}")
+                    months[key] = self.values[key]
+            ratios.append(months[sell_key] / months[buy_key])
+        return ratios
+
+ufe_table = UfeTable(ufe_data)
 
 def get_ufe(month: int, year: int):
-    if month == 1:
-        month = 12
-        year -= 1
-    else:
-        month -= 1
-    for i in ufe_data:
-        if i["Year"] == f"{year}":
-            return Decimal(str(i[f"{month:02d}"]))
-
-def calculate_income(sell_quantity, buy_price, sell_price, buy_date, sell_date):
-    sell_ufe = get_ufe(sell_date.month, sell_date.year)
-    buy_ufe = get_ufe(buy_date.month, buy_date.year)
+    return ufe_table.get(month, year)
+
+# Indexation applies when UFE rose by more than this; built from the float
+# 0.1 as it always was, so results stay the same.
+UFE_THRESHOLD = Decimal(0.1)
+
+def calculate_income(sell_quantity, buy_price, sell_price, buy_date, sell_date, ufe_ratio=None):
+    """
+    ufe_ratio is sell_ufe / buy_ufe for the two dates; callers pricing
+    several lots pass it from one UfeTable.indexation_ratios batch.
+    """
+    if ufe_ratio is None:
+        ufe_ratio, = ufe_table.indexation_ratios([(buy_date, sell_date)])
     sell_amount = sell_quantity * sell_price * get_rate(sell_date)
     buy_amount = sell_quantity * buy_price * get_rate(buy_date)
-    if (sell_ufe - buy_ufe) / buy_ufe > Decimal(0.1):
-        adjusted_buy_amount = buy_amount * (sell_ufe / buy_ufe)
-        print(f"UFE income: {sell_amount - adjusted_buy_amount}, normal income: {sell_amount - buy_amount}")
+    if ufe_ratio - 1 > UFE_THRESHOLD:
+        adjusted_buy_amount = buy_amount * ufe_ratio
+        logger.debug("UFE income: %s, normal income: %s", sell_amount - adjusted_buy_amount, sell_amount - buy_amount)
         return sell_amount - adjusted_buy_amount
     else:
-        print(f"Normal income: {sell_amount - buy_amount} (UFE: {sell_ufe} vs {buy_ufe})")
+        logger.debug("Normal income: %s (UFE ratio: %s)", sell_amount - buy_amount, ufe_ratio)
         return sell_amount - buy_amount
 
+TRANSACTION_FIELDS = ['date', 'symbol', 'transaction_type', 'price', 'quantity',
+                      'transaction_fee', 'total_amount', 'transaction_status', 'transaction_currency']
+
+def transaction_to_json(transaction: Transaction) -> dict:
+    data = {field: str(getattr(transaction, field)) for field in TRANSACTION_FIELDS}
+    data.update(id=transaction.id, pdf_id=transaction.pdf_id, date=transaction.date.isoformat())
+    return data
+
+def transaction_from_json(data: dict) -> Transaction:
+    return Transaction(
+        id=data['id'], pdf_id=data['pdf_id'],
+        date=datetime.fromisoformat(data['date']),
+        symbol=data['symbol'],
+        transaction_type=data['transaction_type'],
+        price=Decimal(data['price']),
+        quantity=Decimal(data['quantity']),
+        transaction_fee=Decimal(data['transaction_fee']),
+        total_amount=Decimal(data['total_amount']),
+        transaction_status=data['transaction_status'],
+        transaction_currency=data['transaction_currency'],
+    )
+
+
+# Trades kept per Stock for the portfolio check details logged at DEBUG.
+DEBUG_HISTORY = 100
+
+class Lot:
+    """An open buy lot: the buy transaction and the quantity not sold yet."""
+    __slots__ = ('transaction', 'quantity')
+
+    def __init__(self, transaction: Transaction, quantity: Decimal = None):
+        self.transaction = transaction
+        self.quantity = transaction.quantity if quantity is None else quantity
+
+    def __str__(self):
+        return f"{self.transaction} ({self.quantity} open)"
+
 class Stock:
-    invalid_transactions = []
-    invalid_sell_transactions = []
-    debug_buy_transactions = []
-    debug_sell_transactions = []
-    profit = Decimal(0)
-    usd_profit =Decimal(0)
-
-    def __init__(self, symbol: str, portfolio: Portfolio):
+    """
+    FIFO state of one symbol for a single calculation. Nothing is shared
+    between instances; the recent-trade history used for debugging is only
+    kept when the calculator.midas logger is at DEBUG, and is bounded.
+    """
+    __slots__ = ('symbol', 'buy_transactions', 'calculated_sell_transactions', 'profits_sell_transactions',
+                 'profit', 'usd_profit', 'portfolio_quantity', 'debug_buy_transactions', 'debug_sell_transactions')
+
+    def __init__(self, symbol: str, debug: bool = None):
         self.symbol = symbol
-        self.transactions = []
-        self.buy_transactions = []
+        self.buy_transactions = deque()  # open Lots, oldest first
         self.calculated_sell_transactions = []
         self.profits_sell_transactions = []
-        self.portfolio = Portfolio(pdf = portfolio.pdf, date = portfolio.date, symbol = portfolio.symbol, quantity = Decimal(0), buy_price = portfolio.buy_price, profit = portfolio.profit)
+        self.profit = Decimal(0)
+        self.usd_profit = Decimal(0)
+        self.portfolio_quantity = Decimal(0)  # for portfolio tracking
+        if debug is None:
+            debug = logger.isEnabledFor(logging.DEBUG)
+        self.debug_buy_transactions = deque(maxlen=DEBUG_HISTORY) if debug else None
+        self.debug_sell_transactions = deque(maxlen=DEBUG_HISTORY) if debug else None
 
     def add_transaction(self, transaction: Transaction):
         if transaction.symbol == self.symbol and transaction.transaction_type == "Alış":
-            copy_transaction = {
-                "date": transaction.date.strftime("%d/%m/%y"),
-                "quantity": str(transaction.quantity)
-            }
-            self.debug_buy_transactions.append(copy_transaction)
-            self.buy_transactions.append(transaction)
-            self.portfolio.quantity += transaction.quantity # for portfolio tracking
+            if self.debug_buy_transactions is not None:
+                self.debug_buy_transactions.append((transaction.date, transaction.quantity))
+            self.buy_transactions.append(Lot(transaction))
+            self.portfolio_quantity += transaction.quantity
 
     def calculate_sell_transaction(self, transaction: Transaction):
         if transaction.symbol == self.symbol and transaction.transaction_type == "Satış":
-            copy_transaction = {
-                "date": transaction.date.strftime("%d/%m/%y"),
-                "quantity": str(transaction.quantity)
-            }
-            self.debug_sell_transactions.append(copy_transaction)
-            for buy_transaction in self.buy_transactions:
-                if buy_transaction.symbol == transaction.symbol and buy_transaction.date < transaction.date:
-                    if buy_transaction.quantity <= 0:
-                        continue
-                    transaction_quantity = min(buy_transaction.quantity, transaction.quantity)
-                    income = calculate_income(
-                        transaction_quantity,
-                        buy_transaction.price,
-                        transaction.price,
-                        buy_transaction.date,
-                        transaction.date
-                    )
-                    income_usd = transaction_quantity * (transaction.price - buy_transaction.price)
-                    if transaction.date.year == 2024:
-                        self.profit += income
-                        self.usd_profit += income_usd
-                        self.profits_sell_transactions.append(income)
-                    buy_transaction.quantity -= transaction_quantity
-                    self.portfolio.quantity -= transaction_quantity # for portfolio tracking
-                    transaction.quantity -= transaction_quantity
-                    if transaction.quantity <= 0:
-                        self.calculated_sell_transactions.append(transaction)
-                        break
-            if transaction.quantity > 0:
-                self.invalid_sell_transactions.append(transaction)
-                raise ValueError(f"Transaction {transaction} has {transaction.quantity} quantity left")
-
-    def add_portfolio(self, portfolio: Portfolio):
-        self.portfolios.append(portfolio)
+            if self.debug_sell_transactions is not None:
+                self.debug_sell_transactions.append((transaction.date, transaction.quantity))
+            # Open lots sit in a queue, oldest first. Fully consumed lots are
+            # popped, so a sell only touches the lots it actually consumes.
+            # Buys are added in date order, so once the oldest open lot is not
+            # before the sell date, no other lot is either. Quantities are
+            # consumed on the lots and a local, never on the transactions.
+            open_lots = self.buy_transactions
+            remaining = transaction.quantity
+            consumed = []
+            while open_lots:
+                lot = open_lots[0]
+                buy_transaction = lot.transaction
+                if lot.quantity <= 0:
+                    open_lots.popleft()
+                    continue
+                if not buy_transaction.date < transaction.date:
+                    break
+                transaction_quantity = min(lot.quantity, remaining)
+                consumed.append((buy_transaction, transaction_quantity))
+                lot.quantity -= transaction_quantity
+                self.portfolio_quantity -= transaction_quantity
+                remaining -= transaction_quantity
+                if lot.quantity <= 0:
+                    open_lots.popleft()
+                if remaining <= 0:
+                    self.calculated_sell_transactions.append(transaction)
+                    break
+            # Every lot this sell consumed is indexed in one UFE batch.
+            ratios = ufe_table.indexation_ratios((buy_transaction.date, transaction.date) for buy_transaction, _ in consumed)
+            for (buy_transaction, transaction_quantity), ufe_ratio in zip(consumed, ratios):
+                income = calculate_income(
+                    transaction_quantity,
+                    buy_transaction.price,
+                    transaction.price,
+                    buy_transaction.date,
+                    transaction.date,
+                    ufe_ratio,
+                )
+                income_usd = transaction_quantity * (transaction.price - buy_transaction.price)
+                if transaction.date.year == 2024:
+                    self.profit += income
+                    self.usd_profit += income_usd
+                    self.profits_sell_transactions.append(income)
+            if remaining > 0:
+                raise ValueError(f"Transaction {transaction} has {remaining} quantity left")
+
+    def state_counts(self) -> tuple:
+        """Number of calculated sells and profits so far, see to_state()."""
+        return len(self.calculated_sell_transactions), len(self.profits_sell_transactions)
+
+    def to_state(self, since: tuple = (0, 0)) -> dict:
+        """
+        JSON-safe FIFO state, stored in lot checkpoints. Only the sells and
+        profits after the state_counts() given as since are included.
+        """
+        sells, profits = since
+        return {
+            'quantity': str(self.portfolio_quantity),
+            'profit': str(self.profit),
+            'usd_profit': str(self.usd_profit),
+            'profits': [str(profit) for profit in self.profits_sell_transactions[profits:]],
+            'open_lots': [transaction_to_json(lot.transaction) | {'open_quantity': str(lot.quantity)}
+                          for lot in self.buy_transactions if lot.quantity > 0],
+            'sells': [transaction_to_json(sell) for sell in self.calculated_sell_transactions[sells:]],
+        }
+
+    @classmethod
+    def from_state(cls, symbol: str, state: dict) -> "Stock":
+        stock = cls(symbol)
+        stock.portfolio_quantity = Decimal(state['quantity'])
+        stock.profit = Decimal(state['profit'])
+        stock.usd_profit = Decimal(state['usd_profit'])
+        stock.profits_sell_transactions = [Decimal(profit) for profit in state['profits']]
+        stock.buy_transactions = deque(Lot(transaction_from_json(lot), Decimal(lot['open_quantity']))
+                                       for lot in state['open_lots'])
+        stock.calculated_sell_transactions = [transaction_from_json(sell) for sell in state['sells']]
+        return stock
 
     def check_portfolio(self, portfolio: Portfolio):
         if portfolio.symbol != self.symbol:
             raise ValueError(f"Portfolio symbol {portfolio.symbol} does not match stock symbol {self.symbol}")
         else:
-            if self.portfolio.quantity == portfolio.quantity:
-                with open("portfolio_log.txt", "a") as f:
-                    f.write(f"check portfolio date: {portfolio.date}\n")
-                    f.write(f"success: {self.symbol} - calculated portfolio:{self.portfolio.quantity} vs {portfolio.quantity}\n")
+            if self.portfolio_quantity == portfolio.quantity:
+                logger.debug("Portfolio check on %s passed: %s - calculated %s vs %s",
+                             portfolio.date, self.symbol, self.portfolio_quantity, portfolio.quantity)
                 return True
             else:
-                with open("portfolio_log.txt", "a") as f:
-                    f.write(f"check portfolio date: {portfolio.date} \nerror:")
-                    f.write(f"{self.symbol} - calculated portfolio:{self.portfolio.quantity} vs {portfolio.quantity}\n")
-                    f.write(f"buy transactions: {str(self.debug_buy_transactions)}\n")
-                    f.write(f"sell transactions: {str(self.debug_sell_transactions)}\n")
-                    if self.symbol == "AMZN":
-                        f.write(f"buy transactions: {str(self.buy_transactions)}\n")
-                        f.write(f"calculated sell transactions: {str(self.calculated_sell_transactions)}\n")
-                        f.write(f"profits sell transactions: {str(self.profits_sell_transactions)}\n")
+                logger.warning("Portfolio check on %s failed: %s - calculated %s vs %s",
+                               portfolio.date, self.symbol, self.portfolio_quantity, portfolio.quantity,
+                               extra={'symbol': self.symbol})
+                if self.debug_buy_transactions is not None:
+                    logger.debug("Portfolio check details for %s", self.symbol, extra={
+                        'symbol': self.symbol,
+                        'buy_transactions': [f"{date:%d/%m/%y} {quantity}" for date, quantity in self.debug_buy_transactions],
+                        'sell_transactions': [f"{date:%d/%m/%y} {quantity}" for date, quantity in self.debug_sell_transactions],
+                        'open_lots': [str(lot) for lot in self.buy_transactions],
+                        'calculated_sell_transactions': [str(sell) for sell in self.calculated_sell_transactions],
+                        'profits': [str(profit) for profit in self.profits_sell_transactions],
+                    })
                 #raise ValueError("portfolio is not corrolated")
                 return False 
 
@@ -0,0 +1,30 @@
+import time
+
+from django.utils.deprecation import MiddlewareMixin
+
+from . import timing
+
+
+class ServerTimingMiddleware(MiddlewareMixin):
+    """
+    Collects the stages timed during a request and reports them in a
+    Server-Timing header, a log record and the in-process stage stats.
+    """
+
+    def process_request(self, request):
+        request._timing = timing.start()
+        request._timing_started = time.perf_counter()
+
+    def process_response(self, request, response):
+        collector = getattr(request, '_timing', None)
+        if collector is None:
+            return response
+        timings = timing.finish(collector)
+        timings['total'] = time.perf_counter() - request._timing_started
+        response['Server-Timing'] = timing.server_timing_header(timings)
+        timing.stats.record(timings)
+        timing.log(
+            f"{request.method} {request.path} {response.status_code}", timings,
+            method=request.method, path=request.path, status=response.status_code,
+        )
+        return response
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0003_alter_transaction_unique_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParseJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('pdf', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='calculator.calculatorpdf')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0005_parsedstatement_calculatorpdf_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calculatorpdf',
+            name='duplicates_removed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
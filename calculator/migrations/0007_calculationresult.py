@@ -0,0 +1,25 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0006_calculatorpdf_duplicates_removed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalculationResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('data', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('calculator', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='calculator.calculator')),
+            ],
+        ),
+    ]
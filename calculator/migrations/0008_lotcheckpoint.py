@@ -0,0 +1,28 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0007_calculationresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LotCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('portfolio_date', models.DateTimeField()),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('state', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('calculator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='calculator.calculator')),
+            ],
+            options={
+                'unique_together': {('calculator', 'portfolio_date')},
+            },
+        ),
+    ]
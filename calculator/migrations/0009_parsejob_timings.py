@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0008_lotcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsejob',
+            name='timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.6 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0009_parsejob_timings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='calculatorpdf',
+            index=models.Index(fields=['calculator', 'portfolio_date'], name='calcpdf_calculator_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='portfolio',
+            index=models.Index(fields=['pdf', 'date', 'symbol'], name='portfolio_pdf_date_symbol_idx'),
+        ),
+    ]
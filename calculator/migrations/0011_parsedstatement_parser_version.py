@@ -0,0 +1,27 @@
+# Generated by Django 4.0.6 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0010_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsedstatement',
+            name='parser_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='parsedstatement',
+            name='sha256',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AlterUniqueTogether(
+            name='parsedstatement',
+            unique_together={('sha256', 'parser_version')},
+        ),
+    ]
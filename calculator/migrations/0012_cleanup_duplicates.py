@@ -0,0 +1,26 @@
+from django.db import migrations
+from django.db.models import Min
+
+
+def remove_duplicates(apps, schema_editor):
+    # Duplicates are removed when a statement is ingested. Rows stored
+    # before that, when every calculation cleaned up instead, are removed
+    # here once: one DELETE keeping the lowest id per calculator and
+    # (date, symbol, type, price, quantity).
+    Transaction = apps.get_model('calculator', 'Transaction')
+    keep_ids = (Transaction.objects
+                .values('pdf__calculator_id', 'date', 'symbol', 'transaction_type', 'price', 'quantity')
+                .annotate(keep_id=Min('id'))
+                .values('keep_id'))
+    Transaction.objects.exclude(id__in=keep_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0011_parsedstatement_parser_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+    ]
@@ -42,7 +42,14 @@ class CalculatorPDF(models.Model):
     account_opening_date = models.DateTimeField(null=True, blank=True)
 
     portfolio_date = models.DateTimeField(null=True, blank=True)
-    
+    sha256 = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    duplicates_removed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # A calculator's statements in month order (calculate_results).
+            models.Index(fields=['calculator', 'portfolio_date'], name='calcpdf_calculator_date_idx'),
+        ]
 
     def __str__(self):
         return self.calculator.name
@@ -76,7 +83,95 @@ class Portfolio(models.Model):
     quantity = models.DecimalField(max_digits=28, decimal_places=14)
     buy_price = models.DecimalField(max_digits=28, decimal_places=14)
     profit = models.DecimalField(max_digits=28, decimal_places=14)
-    
+
+    class Meta:
+        indexes = [
+            # Snapshot lookups and the merge key of the PostgreSQL bulk load.
+            models.Index(fields=['pdf', 'date', 'symbol'], name='portfolio_pdf_date_symbol_idx'),
+        ]
 
     def __str__(self):
         return f"{self.date} - {self.symbol} - {self.quantity}"
+
+
+class ParseJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    pdf = models.ForeignKey(CalculatorPDF, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    error = models.TextField(blank=True)
+    # Seconds spent per stage (see calculator.timing).
+    timings = models.JSONField(default=dict, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.id} - {self.pdf_id} - {self.status}"
+
+
+class ParsedStatement(models.Model):
+    """
+    A parsed statement cached under the SHA-256 of the uploaded file and the
+    parser version that produced it.
+    """
+    sha256 = models.CharField(max_length=64)
+    parser_version = models.PositiveIntegerField(default=1)
+    data = models.JSONField()
+    hits = models.PositiveIntegerField(default=0)
+    misses = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['sha256', 'parser_version']
+
+    def __str__(self):
+        return f"{self.sha256[:12]} v{self.parser_version} - {self.hits} hits"
+
+
+class CalculationResult(models.Model):
+    """
+    Stored output of calculate_results for a calculator. The fingerprint
+    covers its PDFs and the rate/UFE data, so any change makes it stale.
+    """
+    calculator = models.OneToOneField(Calculator, on_delete=models.CASCADE)
+    fingerprint = models.CharField(max_length=64)
+    data = models.JSONField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.calculator_id} - {self.fingerprint[:12]}"
+
+
+class LotCheckpoint(models.Model):
+    """
+    FIFO state of every symbol at the end of one statement month: open lots,
+    realized profit and tracked portfolio quantity. The fingerprint covers
+    all statements up to portfolio_date, so only checkpoints after a newly
+    inserted month go stale.
+    """
+    calculator = models.ForeignKey(Calculator, on_delete=models.CASCADE)
+    portfolio_date = models.DateTimeField()
+    fingerprint = models.CharField(max_length=64)
+    state = models.JSONField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['calculator', 'portfolio_date']
+
+    def __str__(self):
+        return f"{self.calculator_id} - {self.portfolio_date}"
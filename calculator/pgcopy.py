@@ -0,0 +1,54 @@
+"""
+COPY-based bulk loading for PostgreSQL.
+
+Rows are streamed with COPY into a temporary staging table with the target
+table's columns, then merged into the target with one INSERT ... SELECT that
+skips rows already present on the key: ON CONFLICT DO NOTHING when the key
+is a unique constraint, a NOT EXISTS check otherwise.
+"""
+import csv
+import io
+
+from django.db import connection, transaction
+
+NULL = r"\N"
+
+
+def copy_merge(model, objects, key) -> int:
+    """
+    Inserts `objects` (unsaved instances of `model`) unless a row with the
+    same values for the `key` fields exists. Returns the number inserted.
+    """
+    if not objects:
+        return 0
+    meta = model._meta
+    fields = [field for field in meta.concrete_fields if not field.primary_key]
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+    staging = quote(f"{meta.db_table}_staging")
+    columns = ", ".join(quote(field.column) for field in fields)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for obj in objects:
+        values = (field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields)
+        writer.writerow([NULL if value is None else value for value in values])
+    buffer.seek(0)
+
+    key_columns = [meta.get_field(name).column for name in key]
+    distinct = ""
+    if tuple(key) in meta.unique_together:
+        merge = f"ON CONFLICT ({', '.join(map(quote, key_columns))}) DO NOTHING"
+    else:
+        matches = " AND ".join(f"t.{quote(column)} = s.{quote(column)}" for column in key_columns)
+        merge = f"WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE {matches})"
+        # Nothing stops the batch itself from repeating a key.
+        distinct = f"DISTINCT ON ({', '.join(map(quote, key_columns))}) "
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMPORARY TABLE {staging} AS SELECT {columns} FROM {table} WITH NO DATA")
+        cursor.copy_expert(f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{NULL}')", buffer)
+        cursor.execute(f"INSERT INTO {table} ({columns}) SELECT {distinct}{columns} FROM {staging} s {merge}")
+        inserted = cursor.rowcount
+        cursor.execute(f"DROP TABLE {staging}")
+    return inserted
@@ -0,0 +1,249 @@
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+# Part of the statement cache key. Bump it whenever a parser change alters
+# what is read from a statement, so cached statements are parsed again.
+PARSER_VERSION = 1
+
+BROKER_NAME = "Midas Menkul Değerler A.Ş."
+STATEMENT_TITLE = "HESAP EKSTRESİ"
+PORTFOLIO_SECTION = "PORTFÖY ÖZETİ"
+INVESTMENT_SECTION = "YATIRIM İŞLEMLERİ"
+ACCOUNT_SECTION = "HESAP İŞLEMLERİ"
+
+CANCELLED_STATUSES = ['İptal', 'Reddedildi', 'İptal Edildi']
+
+def parse_number(text):
+    """Convert a string number with comma as decimal separator to Decimal."""
+    try:
+        if isinstance(text, str):
+            # Remove thousand separators if both '.' and ',' exist.
+            if '.' in text and ',' in text:
+                text = text.replace('.', '')
+            text = text.replace(',', '.')
+        return Decimal(text)
+    except (ValueError, AttributeError):
+        return None
+
+def extract_dates_from_text(text: str) -> list:
+    dates = re.findall(r"\d{2}/\d{2}/\d{2}", text)
+    return [datetime.strptime(date, "%d/%m/%y") for date in dates]
+
+def parse_transaction_line(line) -> dict:
+    """Return the Transaction field values of a transaction line, or None."""
+    parts = line.strip().split()
+    if len(parts) < 10:
+        return None
+    try:
+        date_str = f"{parts[0]} {parts[1]}"
+        transaction_date = datetime.strptime(date_str, '%d/%m/%y %H:%M:%S')
+        transaction_date = transaction_date.replace(tzinfo=timezone.utc)
+        if parts[6] in CANCELLED_STATUSES:
+            return None
+        transaction_quantity = parse_number(parts[-4])
+        transaction_price = parse_number(parts[-3])
+        transaction_fee = parse_number(parts[-2])
+        total_price = parse_number(parts[-1])
+        if None in [transaction_quantity, transaction_price, transaction_fee, total_price]:
+            return None
+        return {
+            'date': transaction_date,
+            'symbol': parts[4],
+            'transaction_type': parts[5],
+            'price': transaction_price,
+            'quantity': transaction_quantity,
+            'transaction_fee': transaction_fee,
+            'total_amount': total_price,
+            'transaction_status': parts[6],
+            'transaction_currency': parts[7],
+        }
+    except (IndexError, ValueError) as e:
+        logger.warning("Error parsing line: %s (%s)", line, e)
+        return None
+
+
+class MidasStatement:
+    """Everything read from one account statement, independent of the database."""
+
+    def __init__(self):
+        self.statement_dates = []
+        self.account_info = {}
+        self.portfolio_date = None
+        # Field values for Portfolio and Transaction rows, in statement order.
+        self.portfolios = []
+        self.transactions = []
+
+    def to_dict(self) -> dict:
+        """JSON-safe form, used to cache parsed statements."""
+        account_info = dict(self.account_info)
+        if "account_opening_date" in account_info:
+            account_info["account_opening_date"] = [d.isoformat() for d in account_info["account_opening_date"]]
+        return {
+            'statement_dates': [d.isoformat() for d in self.statement_dates],
+            'account_info': account_info,
+            'portfolio_date': self.portfolio_date.isoformat(),
+            'portfolios': [_row_to_json(row) for row in self.portfolios],
+            'transactions': [_row_to_json(row) for row in self.transactions],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MidasStatement":
+        statement = cls()
+        statement.statement_dates = [datetime.fromisoformat(d) for d in data['statement_dates']]
+        statement.account_info = dict(data['account_info'])
+        if "account_opening_date" in statement.account_info:
+            statement.account_info["account_opening_date"] = [
+                datetime.fromisoformat(d) for d in statement.account_info["account_opening_date"]
+            ]
+        statement.portfolio_date = datetime.fromisoformat(data['portfolio_date'])
+        statement.portfolios = [_row_from_json(row) for row in data['portfolios']]
+        statement.transactions = [_row_from_json(row) for row in data['transactions']]
+        return statement
+
+
+DATE_FIELDS = {'date'}
+DECIMAL_FIELDS = {'quantity', 'buy_price', 'profit', 'price', 'transaction_fee', 'total_amount'}
+
+def _row_to_json(row):
+    return {
+        key: value.isoformat() if key in DATE_FIELDS else str(value) if key in DECIMAL_FIELDS else value
+        for key, value in row.items()
+    }
+
+def _row_from_json(row):
+    return {
+        key: datetime.fromisoformat(value) if key in DATE_FIELDS else Decimal(value) if key in DECIMAL_FIELDS else value
+        for key, value in row.items()
+    }
+
+
+class StatementParser:
+    """
+    Single-pass parser for Midas statements.
+
+    Lines are fed one at a time (e.g. straight from page extraction) and
+    routed to the handler of every section they belong to. Errors found
+    mid-stream are held back and raised from finish() in the order the
+    sections appear in a statement, so the first problem is reported.
+    """
+
+    STAGES = ['statement_dates', 'account_info', 'portfolio']
+
+    def __init__(self, source=""):
+        self.source = source
+        self.statement = MidasStatement()
+        self.errors = {}
+        self.has_broker_name = False
+        self.title_line = None
+        self.in_account_info = True
+        self.in_portfolio = False
+        self.in_transactions = False
+
+    def fail(self, stage, error):
+        self.errors.setdefault(stage, error)
+
+    def feed(self, line):
+        if not self.has_broker_name and BROKER_NAME in line:
+            self.has_broker_name = True
+        if self.title_line is None and STATEMENT_TITLE in line:
+            self.title_line = line
+
+        if PORTFOLIO_SECTION in line:
+            if self.in_account_info:
+                self.in_account_info = False
+                if not self.statement.account_info:
+                    self.fail('account_info', ValueError("Account info not found in the statement."))
+            self.in_portfolio = True
+            self.handle_portfolio_header(line)
+        if self.in_account_info:
+            self.handle_account_line(line)
+
+        if INVESTMENT_SECTION in line:
+            self.in_portfolio = False
+            self.in_transactions = True
+        if ACCOUNT_SECTION in line:
+            self.in_transactions = False
+
+        if self.in_portfolio and "USD" in line:
+            self.handle_portfolio_line(line)
+        if self.in_transactions and "Tarih" not in line and "Gerçekleşti" in line:
+            self.handle_transaction_line(line)
+
+    def handle_account_line(self, line):
+        account_info = self.statement.account_info
+        if "Müşteri Adı" in line:
+            account_info["customer_name"] = line.split(":")[1].strip()
+        elif "TCKN" in line:
+            tckn_match = re.search(r'\b\d{11}\b', line)
+            if tckn_match:
+                account_info["tckn"] = tckn_match.group()
+            else:
+                self.fail('account_info', ValueError(f"Could not find valid TCKN in line: {line}"))
+        elif "Hesap Açılış" in line:
+            account_info["account_opening_date"] = extract_dates_from_text(line)
+
+    def handle_portfolio_header(self, line):
+        portfolio_date_list = extract_dates_from_text(line)
+        if len(portfolio_date_list) != 1:
+            self.fail('portfolio', ValueError(f"Invalid number of portfolio dates found: {len(portfolio_date_list)}"))
+            self.in_portfolio = False
+            return
+        self.statement.portfolio_date = portfolio_date_list[0]
+
+    def handle_portfolio_line(self, line):
+        if 'portfolio' in self.errors:
+            return
+        split = line.split()
+        self.statement.portfolios.append({
+            'date': self.statement.portfolio_date.astimezone(timezone.utc),
+            'symbol': split[0],
+            'quantity': parse_number(split[-7]),
+            'buy_price': parse_number(split[-6]),
+            'profit': parse_number(split[-4]),
+        })
+
+    def handle_transaction_line(self, line):
+        if (line.strip() and not line.startswith('Tarih') and
+            not line.startswith('Kayıt') and not line.startswith('Adres:') and
+            len(line.split()) >= 10):
+            transaction = parse_transaction_line(line)
+            if transaction is not None:
+                self.statement.transactions.append(transaction)
+
+    def parse_statement_dates(self):
+        if self.title_line is None:
+            raise ValueError("No statement dates were found in the statement.")
+        statement_dates = sorted(extract_dates_from_text(self.title_line))
+        if len(statement_dates) != 2:
+            raise ValueError(f"Invalid number of statement dates found: {len(statement_dates)}")
+        # Check if dates represent the first and last day of the month.
+        if (statement_dates[0].day != 1 or
+            statement_dates[1].month == (statement_dates[1] + timedelta(days=1)).month):
+            raise ValueError("The statement dates are not the first and last day of the month.")
+        return statement_dates
+
+    def finish(self) -> MidasStatement:
+        if not (self.has_broker_name and self.title_line is not None):
+            raise ValueError(
+                f"{self.source} is not a valid Midas account statement. "
+                "The strings 'Midas Menkul Değerler A.Ş.' or 'HESAP EKSTRESİ' were not found in the statement."
+            )
+        self.statement.statement_dates = self.parse_statement_dates()
+        if self.statement.portfolio_date is None and 'portfolio' not in self.errors:
+            self.fail('portfolio', ValueError("No portfolio date found in the statement."))
+        for stage in self.STAGES:
+            if stage in self.errors:
+                raise self.errors[stage]
+        return self.statement
+
+
+def parse_statement(lines, source="") -> MidasStatement:
+    """Parse an iterable of stripped statement lines in a single pass."""
+    parser = StatementParser(source)
+    for line in lines:
+        parser.feed(line)
+    return parser.finish()
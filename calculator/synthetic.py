@@ -0,0 +1,157 @@
+"""
+Synthetic Midas account statements for tests and benchmarks.
+
+The PDFs are written by hand (one Helvetica text line per statement line)
+so that pypdf extracts them the same way it extracts real statements. Trades
+are random but consistent: sells never exceed the shares bought before them
+and every portfolio summary matches the FIFO holdings at month end.
+"""
+import os
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Turkish letters outside WinAnsiEncoding are mapped onto spare codes
+# through the font's /Differences array.
+GLYPHS = {
+    "Ş": "Scedilla", "ş": "scedilla", "İ": "Idotaccent", "ı": "dotlessi",
+    "Ğ": "Gbreve", "ğ": "gbreve", "Ö": "Odieresis", "ö": "odieresis",
+    "Ü": "Udieresis", "ü": "udieresis", "Ç": "Ccedilla", "ç": "ccedilla",
+}
+GLYPH_CODES = {char: 0x80 + i for i, char in enumerate(GLYPHS)}
+
+LINES_PER_PAGE = 40
+DEFAULT_SYMBOLS = ("AAPL", "MSFT", "NVDA", "TSLA")
+
+
+def encode_text(text: str) -> bytes:
+    encoded = bytearray()
+    for char in text:
+        if char in GLYPH_CODES:
+            encoded.append(GLYPH_CODES[char])
+        else:
+            if char in "()\\":
+                encoded += b"\\"
+            encoded += char.encode("latin-1")
+    return bytes(encoded)
+
+
+def write_pdf(path, pages, title="Hesap Ekstresi"):
+    """Writes a PDF with one page per list of text lines."""
+    differences = " ".join(f"{GLYPH_CODES[char]} /{glyph}" for char, glyph in GLYPHS.items())
+    kids = " ".join(f"{5 + 2 * i} 0 R" for i in range(len(pages)))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode(),
+        (f"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding << /Type /Encoding "
+         f"/BaseEncoding /WinAnsiEncoding /Differences [{differences}] >> >>").encode(),
+        b"<< /Title (" + encode_text(title) + b") /Producer (vergihesapla synthetic) >>",
+    ]
+    for i, lines in enumerate(pages):
+        stream = bytearray(b"BT /F1 8 Tf 10 TL 30 800 Td\n")
+        for line in lines:
+            stream += b"(" + encode_text(line) + b") Tj T*\n"
+        stream += b"ET"
+        objects.append((f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                        f"/Resources << /Font << /F1 3 0 R >> >> /Contents {6 + 2 * i} 0 R >>").encode())
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + bytes(stream) + b"\nendstream")
+
+    output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode()
+    output += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R /Info 4 0 R >>\n"
+               f"startxref\n{xref}\n%%EOF\n").encode()
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+def format_number(value, places=2):
+    """Formats like the statements do: 1.234,56"""
+    text = f"{value:,.{places}f}"
+    return text.replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def month_end(year, month):
+    return datetime(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+
+
+def generate_statements(directory, months=6, symbols=DEFAULT_SYMBOLS, trades=20, seed=1,
+                        start=(2023, 10), tckn="12345678901", customer_name="AYŞE YILMAZ"):
+    """
+    Writes one statement per month into directory and returns their paths,
+    oldest first. Each month has `trades` trades spread over `symbols`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    open_lots = {symbol: [] for symbol in symbols}  # [date, quantity] per buy
+    prices = {symbol: Decimal(rng.randint(50, 400)) for symbol in symbols}
+    paths = []
+    year, month = start
+    for _ in range(months):
+        first_day = datetime(year, month, 1)
+        last_day = month_end(year, month)
+        seconds = int((last_day - first_day).total_seconds()) + 86399 - 3600
+        dates = sorted(first_day + timedelta(seconds=rng.randint(0, seconds)) for _ in range(trades))
+
+        rows = []
+        for date in dates:
+            symbol = rng.choice(symbols)
+            price = prices[symbol] * Decimal(rng.uniform(0.95, 1.06))
+            prices[symbol] = max(Decimal(5), price.quantize(Decimal("0.01")))
+            available = sum(quantity for bought, quantity in open_lots[symbol] if bought < date)
+            if available > 0 and rng.random() < 0.4:
+                quantity = min(available, Decimal(rng.randint(1, 400)) / 100)
+                transaction_type = "Satış"
+                remaining = quantity
+                for lot in open_lots[symbol]:
+                    if lot[0] < date and lot[1] > 0:
+                        taken = min(lot[1], remaining)
+                        lot[1] -= taken
+                        remaining -= taken
+                        if remaining == 0:
+                            break
+            else:
+                quantity = Decimal(rng.randint(1, 500)) / 100
+                transaction_type = "Alış"
+                open_lots[symbol].append([date, quantity])
+            rows.append((date, symbol, transaction_type, quantity, prices[symbol]))
+
+        lines = [
+            "Midas Menkul Değerler A.Ş.",
+            f"HESAP EKSTRESİ {first_day:%d/%m/%y} - {last_day:%d/%m/%y}",
+            f"Müşteri Adı : {customer_name}",
+            f"TCKN : {tckn}",
+            "Hesap Açılış Tarihi : 05/03/22",
+            "Adres: İstanbul",
+            f"PORTFÖY ÖZETİ {last_day:%d/%m/%y}",
+            "Menkul Kıymet Döviz Adet Ort.Maliyet Fiyat Kar/Zarar Piyasa Değeri Maliyet Oran",
+        ]
+        for symbol in symbols:
+            held = sum(quantity for _, quantity in open_lots[symbol])
+            if held > 0:
+                value = format_number(held * prices[symbol])
+                lines.append(f"{symbol} USD {format_number(held, 4)} {format_number(prices[symbol])} "
+                             f"{format_number(prices[symbol])} {format_number(Decimal('12.5'))} {value} {value} 1,00")
+        lines += [
+            "YATIRIM İŞLEMLERİ",
+            "Tarih Saat Valör İşlem Sembol Tür Durum Döviz Emir Adet Fiyat Komisyon Tutar",
+        ]
+        for date, symbol, transaction_type, quantity, price in rows:
+            lines.append(f"{date:%d/%m/%y %H:%M:%S} {date:%d/%m/%y} {date:%H:%M:%S} {symbol} {transaction_type} "
+                         f"Gerçekleşti USD Piyasa {format_number(quantity, 4)} {format_number(price)} 0,00 "
+                         f"{format_number(quantity * price)}")
+        lines += ["HESAP İŞLEMLERİ", "Tarih Açıklama Tutar", f"{last_day:%d/%m/%y} Para Yatırma 1.000,00"]
+
+        path = os.path.join(directory, f"ekstre_{year}_{month:02d}.pdf")
+        write_pdf(path, [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)])
+        paths.append(path)
+        month += 1
+        if month == 13:
+            year, month = year + 1, 1
+    return paths
@@ -1,3 +1,956 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+import importlib
+import json
+import logging
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, connections
+from django.db.migrations.loader import MigrationLoader
+from django.core.files import File
+from django.contrib.auth.models import User
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from pypdf import PdfReader
+
+from .models import Calculator, CalculatorPDF, Transaction, Portfolio, LotCheckpoint, CalculationResult, ParseJob
+from . import jobs
+from .jobs import check_pdf, enqueue_parse, parse_job
+from .pgcopy import copy_merge
+from .extraction import iter_page_texts, page_ranges
+from . import async_views, db, workers
+from .midas import Midas, PersistResult, RateTable, Stock, UfeTable, rates, ufe_data, bulk_insert_transactions, load_cached_statement, statement_cache_stats, transaction_to_json, file_sha256
+from . import log, timing
+from .statement import PARSER_VERSION, extract_dates_from_text, parse_number, parse_statement, parse_transaction_line
+from .synthetic import generate_statements, write_pdf
+from .views import calculate_results, get_calculation
+
+JANUARY = datetime(2024, 1, 31, tzinfo=timezone.utc)
+FEBRUARY = datetime(2024, 2, 29, tzinfo=timezone.utc)
+DECEMBER = datetime(2023, 12, 31, tzinfo=timezone.utc)
+
+
+def create_statements(calculator, trades, symbols=("AAPL", "MSFT")):
+    """
+    Two monthly statements: every trade buys 2 shares in January and sells
+    one of them in February, with matching portfolio snapshots.
+    """
+    january = CalculatorPDF.objects.create(calculator=calculator, pdf="pdfs/test/january.pdf", portfolio_date=JANUARY)
+    february = CalculatorPDF.objects.create(calculator=calculator, pdf="pdfs/test/february.pdf", portfolio_date=FEBRUARY)
+    transactions = []
+    for i in range(trades):
+        symbol = symbols[i % len(symbols)]
+        bought = datetime(2024, 1, 2, tzinfo=timezone.utc) + timedelta(hours=i)
+        sold = datetime(2024, 2, 2, tzinfo=timezone.utc) + timedelta(hours=i)
+        for pdf, date, transaction_type, quantity, price in [
+            (january, bought, "Alış", Decimal(2), Decimal(100)),
+            (february, sold, "Satış", Decimal(1), Decimal(110)),
+        ]:
+            transactions.append(Transaction(
+                pdf=pdf, date=date, symbol=symbol, transaction_type=transaction_type,
+                price=price, quantity=quantity, transaction_fee=Decimal(0),
+                total_amount=price * quantity, transaction_status="Gerçekleşti",
+                transaction_currency="USD",
+            ))
+    Transaction.objects.bulk_create(transactions)
+    for symbol in symbols:
+        count = len(range(symbols.index(symbol), trades, len(symbols)))
+        for pdf, quantity in [(january, 2 * count), (february, count)]:
+            Portfolio.objects.create(
+                pdf=pdf, date=pdf.portfolio_date, symbol=symbol,
+                quantity=Decimal(quantity), buy_price=Decimal(100), profit=Decimal(0),
+            )
+
+
+class TemporaryMediaMixin:
+    """Gives each test a temporary self.directory, with MEDIA_ROOT inside it."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        media = override_settings(MEDIA_ROOT=os.path.join(self.directory, "media"))
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class CalculateResultsQueryTests(TestCase):
+    def count_queries(self, trades):
+        calculator = Calculator.objects.create(name="test")
+        create_statements(calculator, trades)
+        with CaptureQueriesContext(connection) as queries:
+            context = calculate_results(calculator.id)
+        self.assertEqual(len(context['transactions']), trades)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_transactions(self):
+        self.assertEqual(self.count_queries(4), self.count_queries(40))
+
+    def test_results_match_fifo(self):
+        calculator = Calculator.objects.create(name="test")
+        create_statements(calculator, 6)
+        context = calculate_results(calculator.id)
+        usd_profits = {symbol: usd_profit for symbol, _, usd_profit in context['symbol_profits']}
+        self.assertEqual(usd_profits, {"AAPL": Decimal(30), "MSFT": Decimal(30)})
+
+    def test_statements_without_portfolio_date_are_ignored(self):
+        calculator = Calculator.objects.create(name="test")
+        create_statements(calculator, 6)
+        expected = calculate_results(calculator.id, use_checkpoints=False)
+        # Another calculator's identical rows are not duplicates of these.
+        other = Calculator.objects.create(name="other")
+        create_statements(other, 6)
+        legacy = CalculatorPDF.objects.create(calculator=calculator, pdf="pdfs/test/legacy.pdf")
+        Transaction.objects.create(pdf=legacy, date=datetime(2024, 1, 15, tzinfo=timezone.utc), symbol="AAPL",
+                                   transaction_type="Satış", price=Decimal(120), quantity=Decimal(1),
+                                   transaction_fee=Decimal(0), total_amount=Decimal(120))
+        context = calculate_results(calculator.id, use_checkpoints=False)
+        self.assertEqual(context['profit'], expected['profit'])
+        self.assertEqual(context['symbol_profits'], expected['symbol_profits'])
+
+
+class DuplicateCleanupMigrationTests(TestCase):
+    def test_removes_stored_cross_statement_duplicates(self):
+        calculator = Calculator.objects.create(name="test")
+        create_statements(calculator, 6)
+        expected = calculate_results(calculator.id, use_checkpoints=False)
+        # Another calculator's identical rows are not duplicates of these.
+        other = Calculator.objects.create(name="other")
+        create_statements(other, 6)
+
+        # Overlapping statements stored before duplicates were removed at
+        # ingestion: February repeats January's buys.
+        february = CalculatorPDF.objects.get(calculator=calculator, portfolio_date=FEBRUARY)
+        repeated = list(Transaction.objects.filter(pdf__portfolio_date=JANUARY, pdf__calculator=calculator))
+        for transaction in repeated:
+            transaction.id, transaction.pdf = None, february
+        Transaction.objects.bulk_create(repeated)
+        with self.assertRaises(ValueError):
+            calculate_results(calculator.id, use_checkpoints=False)
+
+        migration = importlib.import_module("calculator.migrations.0012_cleanup_duplicates")
+        state = MigrationLoader(connection).project_state(("calculator", "0012_cleanup_duplicates"))
+        migration.remove_duplicates(state.apps, None)
+        self.assertEqual(Transaction.objects.filter(pdf__calculator=calculator).count(), 12)
+        self.assertEqual(Transaction.objects.filter(pdf__calculator=other).count(), 12)
+        context = calculate_results(calculator.id, use_checkpoints=False)
+        self.assertEqual(context['profit'], expected['profit'])
+        self.assertEqual(context['symbol_profits'], expected['symbol_profits'])
+        self.assertEqual([t.id for t in context['transactions']], [t.id for t in expected['transactions']])
+
+
+class CalculationResultCacheTests(TestCase):
+    def test_repeat_reads_skip_recalculation_until_pdfs_change(self):
+        calculator = Calculator.objects.create(name="test")
+        create_statements(calculator, 4)
+        first = get_calculation(calculator.id)
+
+        with mock.patch("calculator.views.calculate_results") as calculate:
+            self.assertEqual(get_calculation(calculator.id), first)
+            calculate.assert_not_called()
+
+        CalculatorPDF.objects.create(calculator=calculator, pdf="pdfs/test/march.pdf")
+        with mock.patch("calculator.views.calculate_results", wraps=calculate_results) as calculate:
+            get_calculation(calculator.id)
+            calculate.assert_called_once()
+
+
+class LotCheckpointTests(TestCase):
+    def setUp(self):
+        self.calculator = Calculator.objects.create(name="test")
+        create_statements(self.calculator, 6)
+
+    def test_resumed_results_match_full_replay(self):
+        full = calculate_results(self.calculator.id, use_checkpoints=False)
+        calculate_results(self.calculator.id)
+        self.assertEqual(
+            list(LotCheckpoint.objects.order_by('portfolio_date').values_list('portfolio_date', flat=True)),
+            [JANUARY, FEBRUARY],
+        )
+        with mock.patch("calculator.views.Stock.from_state", wraps=Stock.from_state) as from_state:
+            resumed = calculate_results(self.calculator.id)
+        self.assertEqual(from_state.call_count, 2)
+        self.assertEqual(resumed['profit'], full['profit'])
+        self.assertEqual(resumed['symbol_profits'], full['symbol_profits'])
+        self.assertEqual([t.date for t in resumed['transactions']], [t.date for t in full['transactions']])
+
+    def test_earlier_month_invalidates_only_later_checkpoints(self):
+        calculate_results(self.calculator.id)
+        january = LotCheckpoint.objects.get(portfolio_date=JANUARY)
+
+        CalculatorPDF.objects.create(calculator=self.calculator, pdf="pdfs/test/december.pdf", portfolio_date=DECEMBER)
+        calculate_results(self.calculator.id)
+        self.assertFalse(LotCheckpoint.objects.filter(id=january.id).exists())
+        checkpoints = dict(LotCheckpoint.objects.values_list('portfolio_date', 'id'))
+        self.assertEqual(set(checkpoints), {DECEMBER, JANUARY, FEBRUARY})
+
+        # Only February and later are replayed when February goes stale.
+        LotCheckpoint.objects.filter(portfolio_date=FEBRUARY).update(fingerprint="stale")
+        calculate_results(self.calculator.id)
+        rebuilt = dict(LotCheckpoint.objects.values_list('portfolio_date', 'id'))
+        self.assertEqual(rebuilt[DECEMBER], checkpoints[DECEMBER])
+        self.assertEqual(rebuilt[JANUARY], checkpoints[JANUARY])
+        self.assertNotEqual(rebuilt[FEBRUARY], checkpoints[FEBRUARY])
+
+    def test_checkpoints_hold_only_their_months_sells(self):
+        calculate_results(self.calculator.id)
+        march = CalculatorPDF.objects.create(calculator=self.calculator, pdf="pdfs/test/march.pdf",
+                                             portfolio_date=datetime(2024, 3, 31, tzinfo=timezone.utc))
+        for transaction in Transaction.objects.filter(transaction_type="Alış"):
+            Transaction.objects.create(
+                pdf=march, date=transaction.date + timedelta(days=61), symbol=transaction.symbol,
+                transaction_type="Satış", price=Decimal(120), quantity=Decimal(1), transaction_fee=Decimal(0),
+                total_amount=Decimal(120), transaction_status="Gerçekleşti", transaction_currency="USD",
+            )
+        calculate_results(self.calculator.id)
+        sells = {
+            checkpoint.portfolio_date.month: [len(state['sells']) for state in checkpoint.state['symbols'].values()]
+            for checkpoint in LotCheckpoint.objects.all()
+        }
+        self.assertEqual(sells, {1: [0, 0], 2: [3, 3], 3: [3, 3]})
+
+        # Resuming from March joins the sells of every checkpoint up again.
+        CalculatorPDF.objects.create(calculator=self.calculator, pdf="pdfs/test/april.pdf",
+                                     portfolio_date=datetime(2024, 4, 30, tzinfo=timezone.utc))
+        full = calculate_results(self.calculator.id, use_checkpoints=False)
+        with mock.patch("calculator.views.Stock.from_state", wraps=Stock.from_state) as from_state:
+            resumed = calculate_results(self.calculator.id)
+        self.assertEqual(from_state.call_count, 2)
+        self.assertEqual(len(resumed['transactions']), 12)
+        self.assertEqual(resumed['profit'], full['profit'])
+        self.assertEqual(resumed['profits'], full['profits'])
+        self.assertEqual([t.date for t in resumed['transactions']], [t.date for t in full['transactions']])
+
+
+class RecalculateCommandTests(TestCase):
+    def test_skips_calculators_with_current_results(self):
+        calculator = Calculator.objects.create(name="test")
+        create_statements(calculator, 4)
+        call_command("recalculate", workers=0, stdout=StringIO())
+        result = CalculationResult.objects.get(calculator=calculator)
+        self.assertEqual(result.data['portfolio_mismatches'], [])
+
+        out = StringIO()
+        call_command("recalculate", workers=0, stdout=out)
+        self.assertIn("1 already up to date", out.getvalue())
+        self.assertEqual(CalculationResult.objects.get(calculator=calculator).id, result.id)
+
+
+class PageExtractionTests(SimpleTestCase):
+    def test_pooled_pages_come_back_in_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pages.pdf")
+            write_pdf(path, [[f"page {i}"] for i in range(7)])
+            serial = list(iter_page_texts(PdfReader(path), path))
+            pooled = list(iter_page_texts(PdfReader(path), path, workers=3, min_pages=2))
+        self.assertEqual([text.strip() for text in serial], [f"page {i}" for i in range(7)])
+        self.assertEqual(pooled, serial)
+        self.assertEqual(page_ranges(7, 3), [(0, 3), (3, 6), (6, 7)])
+
+    def test_pool_workers_extract_serially(self):
+        with mock.patch.object(workers, "in_pool_worker", False), mock.patch.object(log, "parent_queue", None):
+            workers.init_worker(False, None)
+            self.assertTrue(workers.in_pool_worker)
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "pages.pdf")
+                write_pdf(path, [[f"page {i}"] for i in range(7)])
+                with mock.patch("calculator.extraction.get_executor") as get_executor:
+                    texts = list(iter_page_texts(PdfReader(path), path, workers=3, min_pages=2))
+        get_executor.assert_not_called()
+        self.assertEqual([text.strip() for text in texts], [f"page {i}" for i in range(7)])
+
+
+def statement_lines(path):
+    return [line.strip() for text in iter_page_texts(PdfReader(path), path) for line in text.split("\n")]
+
+
+def per_section_extract(lines):
+    """The separate scan per section that Midas did before StatementParser."""
+    title = next(line for line in lines if "HESAP EKSTRESİ" in line)
+    account_info = {}
+    for line in lines:
+        if "PORTFÖY ÖZETİ" in line:
+            break
+        if "Müşteri Adı" in line:
+            account_info["customer_name"] = line.split(":")[1].strip()
+        elif "TCKN" in line:
+            account_info["tckn"] = re.search(r'\b\d{11}\b', line).group()
+        elif "Hesap Açılış" in line:
+            account_info["account_opening_date"] = extract_dates_from_text(line)
+    portfolios, portfolio_date, in_portfolio = [], None, False
+    for line in lines:
+        if "PORTFÖY ÖZETİ" in line:
+            in_portfolio = True
+            portfolio_date = extract_dates_from_text(line)[0]
+        if "YATIRIM İŞLEMLERİ" in line:
+            in_portfolio = False
+        if in_portfolio and "USD" in line:
+            split = line.split()
+            portfolios.append({'date': portfolio_date.astimezone(timezone.utc), 'symbol': split[0],
+                               'quantity': parse_number(split[-7]), 'buy_price': parse_number(split[-6]),
+                               'profit': parse_number(split[-4])})
+    transactions, in_transactions = [], False
+    for line in lines:
+        if "YATIRIM İŞLEMLERİ" in line:
+            in_transactions = True
+        if "HESAP İŞLEMLERİ" in line:
+            in_transactions = False
+        if in_transactions and "Tarih" not in line and "Gerçekleşti" in line and len(line.split()) >= 10:
+            transaction = parse_transaction_line(line)
+            if transaction is not None:
+                transactions.append(transaction)
+    return {
+        'statement_dates': sorted(extract_dates_from_text(title)),
+        'account_info': account_info,
+        'portfolio_date': portfolio_date,
+        'portfolios': portfolios,
+        'transactions': transactions,
+    }
+
+
+class StatementParserTests(SimpleTestCase):
+    def test_matches_per_section_extraction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = generate_statements(directory, months=3, trades=30)
+            statements = [statement_lines(path) for path in paths]
+        # Lines the section boundaries must keep out: a trade-like line in the
+        # account section and a cancelled order.
+        lines = statements[0]
+        lines.insert(lines.index("HESAP İŞLEMLERİ") + 1,
+                     "02/10/23 10:00:00 02/10/23 10:00:00 AAPL Alış Gerçekleşti USD Piyasa 1,0000 10,00 0,00 10,00")
+        lines.insert(lines.index("HESAP İŞLEMLERİ"),
+                     "02/10/23 11:00:00 02/10/23 11:00:00 AAPL Alış İptal USD Gerçekleşti 1,0000 10,00 0,00 10,00")
+        for i, lines in enumerate(statements):
+            with self.subTest(statement=i):
+                statement = parse_statement(lines)
+                expected = per_section_extract(lines)
+                self.assertTrue(expected['transactions'])
+                self.assertEqual({key: getattr(statement, key) for key in expected}, expected)
+
+
+class StatementPersistenceTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = generate_statements(os.path.join(self.directory, "statements"), months=1, trades=8)[0]
+        self.statement = parse_statement(statement_lines(self.path))
+        self.calculator = Calculator.objects.create(name="persist")
+
+    def upload(self, calculator=None):
+        with open(self.path, "rb") as f:
+            return CalculatorPDF.objects.create(calculator=calculator or self.calculator, pdf=File(f, name="statement.pdf"))
+
+    def test_persist_result_counts_on_reingest(self):
+        pdf = self.upload()
+        rows = self.statement.transactions
+        result = bulk_insert_transactions(pdf, [Transaction(pdf=pdf, **row) for row in rows])
+        self.assertEqual(result, PersistResult(inserted=8, skipped=0))
+        result = bulk_insert_transactions(pdf, [Transaction(pdf=pdf, **row) for row in rows[:5]])
+        self.assertEqual(result, PersistResult(inserted=0, skipped=5))
+        self.assertEqual(Transaction.objects.filter(pdf=pdf).count(), 8)
+
+        # Rows repeated within the statement count as skipped too.
+        self.statement.transactions = rows + rows[:2]
+        midas = Midas(self.upload(), statement=self.statement)
+        self.assertEqual(midas.persist_result, PersistResult(inserted=8, skipped=2))
+
+    def test_statement_cache_hit_writes_the_same_rows(self):
+        first, second = self.upload(), self.upload(Calculator.objects.create(name="again"))
+        fields = ['date', 'symbol', 'transaction_type', 'price', 'quantity', 'transaction_fee', 'total_amount',
+                  'transaction_status', 'transaction_currency']
+        check_pdf(first.id)
+        with mock.patch("calculator.midas.PdfReader") as reader:
+            check_pdf(second.id)
+            reader.assert_not_called()
+        for model, fields in [(Transaction, fields), (Portfolio, ['date', 'symbol', 'quantity', 'buy_price', 'profit'])]:
+            rows = [list(model.objects.filter(pdf=pdf).order_by(*fields).values_list(*fields)) for pdf in (first, second)]
+            self.assertTrue(rows[0])
+            self.assertEqual(rows[0], rows[1])
+        self.assertEqual(statement_cache_stats(), {'entries': 1, 'hits': 1, 'misses': 1})
+
+        # A new parser version does not use statements cached by the old one.
+        with mock.patch("calculator.midas.PARSER_VERSION", PARSER_VERSION + 1):
+            self.assertIsNone(load_cached_statement(first.sha256))
+
+    def test_portfolio_rows_are_stored_once(self):
+        pdf = self.upload()
+        first = self.statement.portfolios[0]
+        self.statement.portfolios.append(first | {'quantity': first['quantity'] + 1})
+        Midas(pdf, statement=self.statement)
+        Midas(pdf, statement=self.statement)
+        rows = Portfolio.objects.filter(pdf=pdf)
+        self.assertEqual(rows.count(), len(self.statement.portfolios) - 1)
+        self.assertEqual(rows.get(symbol=first['symbol']).quantity, first['quantity'])
+
+    def test_failed_write_leaves_nothing_behind(self):
+        pdf = self.upload()
+        with mock.patch("calculator.midas.bulk_insert_transactions", side_effect=RuntimeError("disk full")):
+            with self.assertRaises(RuntimeError):
+                Midas(pdf, statement=self.statement)
+        self.assertFalse(Portfolio.objects.filter(pdf=pdf).exists())
+
+        self.statement.portfolios[-1]['quantity'] = None
+        with self.assertRaises(IntegrityError):
+            Midas(pdf, statement=self.statement)
+        self.assertFalse(Portfolio.objects.filter(pdf=pdf).exists())
+        self.assertFalse(Transaction.objects.filter(pdf=pdf).exists())
+        pdf.refresh_from_db()
+        self.assertIsNone(pdf.portfolio_date)
+
+
+class IngestStatementsCommandTests(TemporaryMediaMixin, TestCase):
+    def ingest(self, source):
+        out = StringIO()
+        call_command("ingest_statements", source, workers=0, stdout=out)
+        return out.getvalue()
+
+    def test_rerun_skips_ingested_files(self):
+        source = os.path.join(self.directory, "statements")
+        generate_statements(source, months=2, trades=5)
+        # Each file is hashed once, by the command; Midas is handed the hash.
+        with (mock.patch("calculator.management.commands.ingest_statements.file_sha256", wraps=file_sha256) as command_hash,
+              mock.patch("calculator.midas.file_sha256") as midas_hash):
+            self.assertIn("0 already ingested, 2 to ingest", self.ingest(source))
+        self.assertEqual(command_hash.call_count, 2)
+        midas_hash.assert_not_called()
+        self.assertEqual(
+            sorted(CalculatorPDF.objects.values_list("sha256", flat=True)),
+            sorted(file_sha256(os.path.join(source, name)) for name in os.listdir(source)),
+        )
+
+        out = self.ingest(source)
+        self.assertIn("2 already ingested, 0 to ingest", out)
+        self.assertIn("Ingested 0 statements", out)
+        self.assertEqual(CalculatorPDF.objects.count(), 2)
+        self.assertEqual(Calculator.objects.count(), 1)
+
+    def test_statements_are_grouped_by_tckn(self):
+        existing = Calculator.objects.create(name="existing", tckn=12345678901)
+        source = os.path.join(self.directory, "statements")
+        generate_statements(os.path.join(source, "a"), months=2, trades=5)
+        generate_statements(os.path.join(source, "b"), months=2, trades=5, tckn="10987654321",
+                            customer_name="MEHMET KAYA")
+        self.assertIn("Ingested 4 statements into 2 calculators", self.ingest(source))
+
+        self.assertEqual(Calculator.objects.count(), 2)
+        self.assertEqual(CalculatorPDF.objects.filter(calculator=existing).count(), 2)
+        created = Calculator.objects.get(tckn=10987654321)
+        self.assertEqual(created.customer_name, "MEHMET KAYA")
+        self.assertEqual(CalculatorPDF.objects.filter(calculator=created).count(), 2)
+
+
+class SyntheticStatementTests(TemporaryMediaMixin, TestCase):
+    def test_generated_statements_parse_and_reconcile(self):
+        paths = generate_statements(os.path.join(self.directory, "statements"), months=3, trades=15)
+        calculator = Calculator.objects.create(name="test")
+        for path in paths:
+            with open(path, "rb") as f:
+                pdf_object = CalculatorPDF.objects.create(calculator=calculator, pdf=File(f, name=os.path.basename(path)))
+            check_pdf(pdf_object.id)
+
+        self.assertEqual(Transaction.objects.filter(pdf__calculator=calculator).count(), 45)
+        self.assertEqual(CalculatorPDF.objects.get(id=pdf_object.id).tckn, 12345678901)
+        # The final portfolio check raises if the FIFO holdings do not match.
+        context = calculate_results(calculator.id)
+        self.assertEqual(context['portfolio_mismatches'], [])
+
+    @override_settings(CALCULATOR_PARSE_WORKERS=0)
+    def test_batch_upload_of_pdfs_and_zip(self):
+        paths = generate_statements(os.path.join(self.directory, "statements"), months=3, trades=5)
+        archive_path = os.path.join(self.directory, "statements.zip")
+        with zipfile.ZipFile(archive_path, "w") as archive:
+            for path in paths[1:]:
+                archive.write(path, os.path.join("statements", os.path.basename(path)))
+            archive.writestr("notes.txt", "not a statement")
+        calculator = Calculator.objects.create(name="batch")
+
+        with open(paths[0], "rb") as pdf, open(archive_path, "rb") as archive:
+            response = self.client.post("/calculator/upload-pdfs/", {"calculator_id": calculator.id, "files": [pdf, archive]})
+
+        self.assertEqual(response.status_code, 202)
+        results = response.json()['results']
+        self.assertEqual([result['file'] for result in results], [os.path.basename(path) for path in paths] + ["notes.txt"])
+        self.assertEqual([result.get('status') for result in results], ["done"] * 3 + [None])
+        self.assertEqual(results[-1]['error'], "Not a PDF file")
+        self.assertEqual(Transaction.objects.filter(pdf__calculator=calculator).count(), 15)
+
+
+class ParseJobTests(TestCase):
+    def setUp(self):
+        calculator = Calculator.objects.create(name="jobs")
+        self.pdf = CalculatorPDF.objects.create(calculator=calculator, pdf="pdfs/test/notes.txt")
+
+    @override_settings(CALCULATOR_PARSE_WORKERS=0)
+    def test_enqueue_runs_inline_without_workers(self):
+        job = enqueue_parse(self.pdf)
+        self.assertEqual(job.status, ParseJob.FAILED)
+        self.assertEqual(job.error, "Invalid PDF file")
+
+    @override_settings(CALCULATOR_PARSE_WORKERS=2)
+    def test_enqueue_submits_once_committed(self):
+        with mock.patch("calculator.jobs.submit") as submit, self.captureOnCommitCallbacks(execute=True):
+            job = enqueue_parse(self.pdf)
+            submit.assert_not_called()
+        submit.assert_called_once_with(job.id)
+        self.assertEqual(job.status, ParseJob.QUEUED)
+
+    def test_job_status(self):
+        job = ParseJob.objects.create(pdf=self.pdf, status=ParseJob.DONE, timings={"db_write": 0.01234})
+        self.assertEqual(self.client.get(f"/calculator/api/jobs/{job.id}/").json(), {
+            'job_id': job.id, 'status': 'done', 'error': '',
+            'calculator_id': self.pdf.calculator_id, 'timings_ms': {'db_write': 12.34},
+        })
+        self.assertEqual(self.client.get(f"/calculator/api/jobs/{job.id + 1}/").status_code, 404)
+
+    def test_resume_stale_jobs(self):
+        stale = ParseJob.objects.create(pdf=self.pdf, status=ParseJob.RUNNING)
+        recent = ParseJob.objects.create(pdf=self.pdf)
+        ParseJob.objects.filter(id=stale.id).update(updated_at=datetime.now(timezone.utc) - timedelta(hours=1))
+
+        out = StringIO()
+        call_command("resume_parse_jobs", stdout=out)
+        self.assertIn("Re-ran 1 stale jobs: 0 done, 1 failed", out.getvalue())
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.error), (ParseJob.FAILED, "Invalid PDF file"))
+        self.assertEqual(ParseJob.objects.get(id=recent.id).status, ParseJob.QUEUED)
+
+        call_command("resume_parse_jobs", stale_minutes=0, fail=True, stdout=StringIO())
+        recent.refresh_from_db()
+        self.assertEqual((recent.status, recent.error), (ParseJob.FAILED, "Parse job was interrupted"))
+
+
+def reject_writes(execute, sql, params, many, context):
+    if not sql.lstrip().upper().startswith(("SELECT", "PRAGMA")):
+        raise AssertionError(f"Pool worker wrote to the database: {sql}")
+    return execute(sql, params, many, context)
+
+
+def read_only_parse_job(job_id):
+    """parse_job as a pool worker runs it: on a connection of its own that must not write."""
+    try:
+        with connection.execute_wrapper(reject_writes):
+            return parse_job(job_id)
+    finally:
+        connection.close()
+
+
+class ParseJobPoolTests(TemporaryMediaMixin, TransactionTestCase):
+    # Threads stand in for the pool's worker processes; the done-callbacks
+    # and the writer thread use connections of their own.
+    def setUp(self):
+        super().setUp()
+        self.executor = ThreadPoolExecutor(max_workers=3)
+        self.addCleanup(self.executor.shutdown)
+        patcher = mock.patch("calculator.jobs.get_executor", return_value=self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Closed before the test database is dropped.
+        self.addCleanup(lambda: db.writer.submit(connections.close_all).result())
+
+    def wait_for_jobs(self):
+        # Joining the workers waits for the done-callbacks, and an empty
+        # write for what they queued on the writer thread.
+        self.executor.shutdown(wait=True)
+        db.write_later(lambda: None).result()
+
+    def test_job_the_pool_could_not_run_is_failed(self):
+        calculator = Calculator.objects.create(name="jobs")
+        job = ParseJob.objects.create(pdf=CalculatorPDF.objects.create(calculator=calculator, pdf="pdfs/test/a.pdf"))
+        broken = BrokenProcessPool("A process in the process pool was terminated abruptly")
+        with mock.patch("calculator.jobs.parse_job", side_effect=broken):
+            future = jobs.submit(job.id)
+            self.wait_for_jobs()
+        self.assertIs(future.exception(), broken)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ParseJob.FAILED)
+        self.assertEqual(job.error, str(broken))
+
+    def test_pooled_parse_timings_are_recorded_here(self):
+        calculator = Calculator.objects.create(name="jobs")
+        job = ParseJob.objects.create(pdf=CalculatorPDF.objects.create(calculator=calculator, pdf="pdfs/test/a.txt"))
+        stats = timing.StageStats()
+        with mock.patch.object(timing, "stats", stats):
+            # The worker process's own stats are never seen by the web process.
+            parsed = read_only_parse_job(job.id)
+            self.assertEqual(parsed.error, "Invalid PDF file")
+            self.assertEqual(stats.snapshot(), {})
+
+            with mock.patch("calculator.jobs.parse_job", return_value=parsed._replace(timings={"pdf_extract": 0.25})):
+                jobs.submit(job.id)
+                self.wait_for_jobs()
+        self.assertEqual(ParseJob.objects.get(id=job.id).timings, {"pdf_extract": 0.25})
+        self.assertEqual(stats.snapshot(), {"pdf_extract": {"count": 1, "p50_ms": 250.0, "p95_ms": 250.0}})
+
+    def test_concurrent_jobs_are_all_saved(self):
+        paths = generate_statements(os.path.join(self.directory, "statements"), months=6, trades=10)
+        calculator = Calculator.objects.create(name="jobs")
+        job_ids = []
+        for path in paths:
+            with open(path, "rb") as f:
+                pdf = CalculatorPDF.objects.create(calculator=calculator, pdf=File(f, name=os.path.basename(path)))
+            job_ids.append(ParseJob.objects.create(pdf=pdf).id)
+        with mock.patch("calculator.jobs.parse_job", side_effect=read_only_parse_job):
+            for job_id in job_ids:
+                jobs.submit(job_id)
+            self.wait_for_jobs()
+        statuses = ParseJob.objects.filter(id__in=job_ids).values_list('status', 'error')
+        self.assertEqual(list(statuses), [(ParseJob.DONE, '')] * 6)
+        self.assertEqual(calculate_results(calculator.id)['portfolio_mismatches'], [])
+        self.assertEqual(statement_cache_stats(), {'entries': 6, 'hits': 0, 'misses': 6})
+
+    def test_save_is_retried_while_the_database_is_locked(self):
+        path = generate_statements(os.path.join(self.directory, "statements"), months=1, trades=5)[0]
+        calculator = Calculator.objects.create(name="jobs")
+        with open(path, "rb") as f:
+            pdf = CalculatorPDF.objects.create(calculator=calculator, pdf=File(f, name="statement.pdf"))
+        job = ParseJob.objects.create(pdf=pdf)
+        save_portfolio = Midas.save_portfolio
+        attempts = []
+
+        def locked_twice(midas):
+            attempts.append(midas)
+            if len(attempts) <= 2:
+                raise OperationalError("database is locked")
+            return save_portfolio(midas)
+
+        with mock.patch("calculator.jobs.parse_job", side_effect=read_only_parse_job), \
+                mock.patch.object(Midas, "save_portfolio", locked_twice), \
+                mock.patch("calculator.db.time.sleep") as sleep:
+            jobs.submit(job.id)
+            self.wait_for_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (ParseJob.DONE, ''))
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.1, 0.2])
+        self.assertEqual(Transaction.objects.filter(pdf=pdf).count(), 5)
+        self.assertEqual(statement_cache_stats(), {'entries': 1, 'hits': 0, 'misses': 1})
+
+
+class AsyncViewTests(TemporaryMediaMixin, TransactionTestCase):
+    # The async views run their work on a separate thread pool, whose
+    # connections would not see a TestCase's uncommitted transaction.
+    def setUp(self):
+        super().setUp()
+        self.factory = AsyncRequestFactory()
+        # A pool of our own, so its thread's connection can be closed before
+        # the test database is dropped.
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        self.addCleanup(lambda: executor.submit(connections.close_all).result())
+        patcher = mock.patch.object(async_views, "executor", executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(CALCULATOR_PARSE_WORKERS=0)
+    async def test_upload_and_results(self):
+        paths = generate_statements(os.path.join(self.directory, "statements"), months=2, trades=5)
+        request = self.factory.post("/calculator/api/create-calculator/", {}, content_type="application/json")
+        calculator_id = json.loads((await async_views.create_id_calculator(request)).content)['calculator_id']
+
+        with open(paths[0], "rb") as first, open(paths[1], "rb") as second:
+            request = self.factory.post("/calculator/upload-pdfs/", {"calculator_id": calculator_id, "files": [first, second]})
+            # Django 4.0's FakePayload rejects the multipart parser's full-size reads.
+            request._stream = BytesIO(request._stream.read())
+            response = await async_views.upload_pdfs(request)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual([result['status'] for result in json.loads(response.content)['results']], ["done", "done"])
+
+        request = self.factory.post("/calculator/results/", {"calculator_id": calculator_id}, content_type="application/json")
+        response = await async_views.get_results(request)
+        self.assertEqual(response.status_code, 200)
+
+        request = self.factory.post("/calculator/results/", {"calculator_id": 0}, content_type="application/json")
+        self.assertEqual((await async_views.get_results(request)).status_code, 404)
+
+
+def log_in_worker(message):
+    logging.getLogger("calculator.tests").info(message)
+
+
+class QueueFileHandlerTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        # The handler publishes its queue for process_pool; keep the one from settings.
+        self.addCleanup(setattr, log, "listener_queue", log.listener_queue)
+        self.handler = log.QueueFileHandler(os.path.join(self.directory, "calculator.log"))
+        self.handler.setFormatter(log.JsonFormatter())
+        self.handler.console.setStream(StringIO())
+
+    def read_records(self):
+        with open(os.path.join(self.directory, "calculator.log"), encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_records_go_to_one_file_and_warnings_to_the_console(self):
+        self.handler.handle(logging.makeLogRecord({'msg': "parsed", 'levelno': logging.INFO}))
+        self.handler.handle(logging.makeLogRecord({'msg': "slow", 'levelno': logging.WARNING,
+                                                   'levelname': 'WARNING', 'pages': 3}))
+        console = self.handler.console.stream
+        self.handler.close()
+        self.assertEqual([(record['message'], record.get('pages')) for record in self.read_records()],
+                         [("parsed", None), ("slow", 3)])
+        self.assertEqual(console.getvalue(), "slow\n")
+        self.assertEqual(os.listdir(self.directory), ["calculator.log"])
+
+    def test_pool_workers_log_through_the_parent(self):
+        with workers.process_pool(1) as executor:
+            executor.submit(log_in_worker, "from the worker").result()
+        self.handler.close()
+        [record] = self.read_records()
+        self.assertEqual(record['message'], "from the worker")
+        self.assertNotEqual(record['process'], os.getpid())
+        self.assertEqual(os.listdir(self.directory), ["calculator.log"])
+
+
+class TimingTests(TestCase):
+    def test_nested_stages_report_their_own_time(self):
+        collector = timing.start()
+        with mock.patch("calculator.timing.time.perf_counter", side_effect=[0.0, 1.0, 3.0, 4.0]):
+            with timing.stage("outer"):
+                with timing.stage("inner"):
+                    pass
+        self.assertEqual(timing.finish(collector), {"outer": 2.0, "inner": 2.0})
+
+    def test_results_view_sends_server_timing(self):
+        calculator = Calculator.objects.create(name="test")
+        create_statements(calculator, 4)
+        response = self.client.post("/calculator/results/", data=json.dumps({"calculator_id": calculator.id}),
+                                    content_type="application/json")
+        stages = [entry.split(";")[0] for entry in response["Server-Timing"].split(", ")]
+        for name in ["db_load", "fifo", "results_cache", "render", "total"]:
+            self.assertIn(name, stages)
+
+        self.assertEqual(self.client.get("/calculator/api/timing-stats/").status_code, 302)
+        self.client.force_login(User.objects.create_user("staff", password="x", is_staff=True))
+        stats = self.client.get("/calculator/api/timing-stats/").json()
+        self.assertGreaterEqual(stats["stages"]["fifo"]["count"], 1)
+        self.assertEqual(stats["statement_cache"], {'entries': 0, 'hits': 0, 'misses': 0})
+
+
+def day_walk_rate(rates, date):
+    """get_rate as it was before RateTable: walk back a day at a time."""
+    while True:
+        date -= timedelta(days=1)
+        if date.strftime("%d-%m-%Y") in rates:
+            return Decimal(str(rates[date.strftime("%d-%m-%Y")]))
+
+
+class RateTableTests(SimpleTestCase):
+    def test_matches_day_walk(self):
+        table = RateTable(rates)
+        date = datetime(2020, 1, 3, 15, 30, tzinfo=timezone.utc)
+        while date < datetime(2025, 2, 1, tzinfo=timezone.utc):
+            self.assertEqual(table.get(date), day_walk_rate(rates, date), date)
+            date += timedelta(days=1)
+
+    def test_dates_outside_the_data_are_an_error(self):
+        table = RateTable({"02-01-2024": 30.0, "30-04-2024": 32.5})
+        self.assertEqual(table.get(datetime(2024, 5, 31)), Decimal("32.5"))
+        for date in [datetime(2024, 1, 2), datetime(2024, 6, 1)]:
+            with self.subTest(date=date), self.assertRaisesMessage(
+                    ValueError, "rates are available from 03-01-2024 to 31-05-2024"):
+                table.get(date)
+
+
+def linear_scan_ufe(ufe_data, month, year):
+    """get_ufe as it was before UfeTable."""
+    if month == 1:
+        month, year = 12, year - 1
+    else:
+        month -= 1
+    for row in ufe_data:
+        if row["Year"] == f"{year}":
+            return Decimal(str(row[f"{month:02d}"]))
+
+
+class UfeTableTests(SimpleTestCase):
+    def test_matches_linear_scan(self):
+        table = UfeTable(ufe_data)
+        years = [int(row["Year"]) for row in ufe_data]
+        for year in range(min(years) - 1, max(years) + 2):
+            for month in range(1, 13):
+                self.assertEqual(table.get(month, year), linear_scan_ufe(ufe_data, month, year), (month, year))
+
+    def test_indexation_ratios_match_per_row_lookup(self):
+        table = UfeTable(ufe_data)
+        years = sorted({int(row["Year"]) for row in ufe_data})[-3:]
+        dates = [datetime(year, month, 15) for year in years for month in range(1, 13) if table.get(month, year)]
+        pairs = [(buy_date, sell_date) for buy_date in dates for sell_date in dates if buy_date <= sell_date]
+        expected = [table.get(sell.month, sell.year) / table.get(buy.month, buy.year) for buy, sell in pairs]
+        self.assertEqual(table.indexation_ratios(pairs), expected)
+        with self.assertRaisesMessage(ValueError, f"No UFE index found for 01/{years[-1] + 2}"):
+            table.indexation_ratios([(dates[0], datetime(years[-1] + 2, 1, 15))])
+
+
+class StockTests(TestCase):
+    def test_state_is_per_instance_and_debug_history_is_opt_in(self):
+        first, second = Stock("AAPL"), Stock("AAPL", debug=True)
+        self.assertFalse(hasattr(first, "__dict__"))
+        self.assertIsNone(first.debug_buy_transactions)
+        for i in range(150):
+            second.add_transaction(Transaction(
+                date=JANUARY + timedelta(minutes=i), symbol="AAPL", transaction_type="Alış",
+                price=Decimal(100), quantity=Decimal(1),
+            ))
+        self.assertEqual(second.portfolio_quantity, Decimal(150))
+        self.assertEqual(len(second.debug_buy_transactions), 100)
+        self.assertEqual(first.portfolio_quantity, Decimal(0))
+        self.assertEqual(len(first.buy_transactions), 0)
+
+    def test_sell_consumes_oldest_lots_first(self):
+        stock = Stock("AAPL")
+
+        def trade(day, transaction_type, quantity, price):
+            transaction = Transaction(date=datetime(2024, 1, day, tzinfo=timezone.utc), symbol="AAPL",
+                                      transaction_type=transaction_type, price=Decimal(price), quantity=Decimal(quantity))
+            if transaction_type == "Alış":
+                stock.add_transaction(transaction)
+            else:
+                stock.calculate_sell_transaction(transaction)
+            return transaction
+
+        first, second, third = trade(2, "Alış", 3, 10), trade(3, "Alış", 2, 20), trade(4, "Alış", 5, 30)
+        trade(10, "Satış", 4, 40)
+        # The first lot is used up and popped; the second is left with one share.
+        open_lots = lambda: [(lot.transaction, lot.quantity) for lot in stock.buy_transactions]
+        self.assertEqual(open_lots(), [(second, Decimal(1)), (third, Decimal(5))])
+        self.assertEqual(stock.usd_profit, 3 * Decimal(30) + 1 * Decimal(20))
+        self.assertEqual(len(stock.profits_sell_transactions), 2)
+
+        trade(11, "Satış", "1.5", 40)
+        self.assertEqual(open_lots(), [(third, Decimal("4.5"))])
+        self.assertEqual(stock.portfolio_quantity, Decimal("4.5"))
+        with self.assertRaisesMessage(ValueError, "has 0.5 quantity left"):
+            trade(12, "Satış", 5, 40)
+
+    def test_replay_leaves_transactions_unchanged(self):
+        trades = [
+            Transaction(date=datetime(2024, 1, day, tzinfo=timezone.utc), symbol="AAPL", transaction_type=transaction_type,
+                        price=Decimal(price), quantity=Decimal(quantity))
+            for day, transaction_type, quantity, price in [
+                (2, "Alış", 3, 10), (3, "Alış", 2, 20), (10, "Satış", 4, 40), (11, "Satış", 1, 40),
+            ]
+        ]
+        before = [transaction_to_json(transaction) for transaction in trades]
+        stock = Stock("AAPL")
+        for transaction in trades:
+            if transaction.transaction_type == "Alış":
+                stock.add_transaction(transaction)
+            else:
+                stock.calculate_sell_transaction(transaction)
+        self.assertEqual([transaction_to_json(transaction) for transaction in trades], before)
+        self.assertEqual([sell.quantity for sell in stock.calculated_sell_transactions], [Decimal(4), Decimal(1)])
+        self.assertEqual(stock.portfolio_quantity, 0)
+
+
+@override_settings(CALCULATOR_WRITER_THREAD=True)
+class WriterTests(SimpleTestCase):
+    def test_writes_run_in_order_on_one_thread(self):
+        threads = []
+        results = [db.write(lambda i=i: threads.append(threading.get_ident()) or i) for i in range(3)]
+        self.assertEqual(results, [0, 1, 2])
+        self.assertEqual(len(set(threads)), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+        with self.assertRaises(ZeroDivisionError):
+            db.write(lambda: 1 / 0)
+
+    @override_settings(CALCULATOR_WRITER_THREAD=False)
+    def test_runs_inline_when_disabled(self):
+        self.assertEqual(db.write(threading.get_ident), threading.get_ident())
+
+
+@skipUnless(connection.vendor == 'sqlite', "SQLite only")
+class SqliteConnectionTests(TestCase):
+    def test_pragmas_and_inline_write_in_transaction(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 20000)
+        # Test cases run inside a transaction, which the write has to join.
+        self.assertEqual(db.write(threading.get_ident), threading.get_ident())
+
+    def test_kept_databases_keep_their_journal_mode(self):
+        with tempfile.TemporaryDirectory() as directory:
+            kept, other = os.path.join(directory, "kept.sqlite3"), os.path.join(directory, "other.sqlite3")
+            modes = []
+            with override_settings(SQLITE_KEEP_JOURNAL_MODE=[kept]):
+                for name in [kept, other]:
+                    wrapper = type(connections["default"])({**connection.settings_dict, 'NAME': name}, alias="journal")
+                    with wrapper.cursor() as cursor:
+                        cursor.execute("PRAGMA journal_mode")
+                        modes.append(cursor.fetchone()[0])
+                    wrapper.close()
+        self.assertEqual(modes, ["delete", "wal"])
+
+
+@skipUnless(connection.vendor == 'postgresql', "PostgreSQL only")
+class CopyMergeTests(TestCase):
+    def test_merges_on_key(self):
+        pdf = CalculatorPDF.objects.create(calculator=Calculator.objects.create(name="copy"), pdf="pdfs/test/copy.pdf")
+
+        def transaction(price):
+            return Transaction(pdf=pdf, date=JANUARY, symbol="AAPL", transaction_type="Alış", price=Decimal(price),
+                               quantity=Decimal("1.5"), transaction_fee=Decimal(0), total_amount=Decimal(price),
+                               transaction_status="Gerçekleşti", transaction_currency="USD")
+
+        self.assertEqual(copy_merge(Transaction, [transaction("10"), transaction("11")], Transaction._meta.unique_together[0]), 2)
+        self.assertEqual(copy_merge(Transaction, [transaction("11"), transaction("12")], Transaction._meta.unique_together[0]), 1)
+        self.assertEqual(Transaction.objects.get(pdf=pdf, price=12).transaction_status, "Gerçekleşti")
+
+        portfolio = Portfolio(pdf=pdf, date=JANUARY, symbol="AAPL", quantity=Decimal(3), buy_price=Decimal(10), profit=Decimal(0))
+        self.assertEqual(copy_merge(Portfolio, [portfolio, portfolio], ('pdf', 'date', 'symbol')), 1)
+        self.assertEqual(copy_merge(Portfolio, [portfolio], ('pdf', 'date', 'symbol')), 0)
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN is SQLite syntax")
+class QueryPlanTests(TestCase):
+    """Hot queries must find their rows through an index, not a full scan."""
+    TABLES = ('calculator_calculatorpdf', 'calculator_transaction', 'calculator_portfolio')
+
+    def plans(self, function):
+        with CaptureQueriesContext(connection) as queries:
+            function()
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if query['sql'].startswith('SELECT') and any(table in query['sql'] for table in self.TABLES):
+                    cursor.execute("EXPLAIN QUERY PLAN " + query['sql'])
+                    plans[query['sql']] = [row[3] for row in cursor.fetchall()]
+        self.assertTrue(plans)
+        for sql, plan in plans.items():
+            for step in plan:
+                self.assertFalse(step.startswith(tuple(f"SCAN {table}" for table in self.TABLES)), f"{step} in {sql}")
+        return plans
+
+    def test_calculate_results(self):
+        calculator = Calculator.objects.create(name="plans")
+        create_statements(calculator, 4)
+        plans = self.plans(lambda: calculate_results(calculator.id))
+        pdf_query = next(plan for sql, plan in plans.items() if sql.startswith('SELECT "calculator_calculatorpdf"'))
+        self.assertEqual(pdf_query, ['SEARCH calculator_calculatorpdf USING INDEX calcpdf_calculator_date_idx '
+                                     '(calculator_id=? AND portfolio_date>?)'])
+        # Resuming from the checkpoints written above.
+        self.plans(lambda: calculate_results(calculator.id))
+
+    def test_admin_list_views(self):
+        calculator = Calculator.objects.create(name="plans")
+        create_statements(calculator, 4)
+        Portfolio.objects.create(pdf=calculator.calculatorpdf_set.first(), date=JANUARY, symbol="AAPL",
+                                 quantity=Decimal(2), buy_price=Decimal(10), profit=Decimal(0))
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+        for url, lookup in [("/admin/calculator/transaction/", "pdf__calculator__id__exact"),
+                            ("/admin/calculator/portfolio/", "pdf__calculator__id__exact"),
+                            ("/admin/calculator/calculatorpdf/", "calculator__id__exact")]:
+            with self.subTest(url=url):
+                self.plans(lambda: self.client.get(url, {lookup: calculator.id}))
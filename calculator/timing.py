@@ -0,0 +1,132 @@
+"""
+Lightweight per-stage timing.
+
+Code marks its stages with `with stage("name"):`. While a collector is active
+(one per request, installed by ServerTimingMiddleware, or per parse job) the
+time of every stage is added up; nested stages are subtracted from their
+parent, so each stage reports only its own time. Outside a collector stage()
+does nothing but read the clock.
+
+Finished collections are aggregated in-process by `stats` (counts, p50, p95
+from a bounded reservoir per stage).
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+_collector = ContextVar("calculator_timing_collector", default=None)
+
+
+class Collector:
+    def __init__(self):
+        self.timings = {}
+        # Time spent in child stages, one entry per open stage.
+        self.children = []
+
+    def enter(self):
+        self.children.append(0.0)
+
+    def exit(self, name, elapsed):
+        own = elapsed - self.children.pop()
+        self.timings[name] = self.timings.get(name, 0.0) + own
+        if self.children:
+            self.children[-1] += elapsed
+
+
+@contextmanager
+def stage(name):
+    collector = _collector.get()
+    if collector is None:
+        yield
+        return
+    collector.enter()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        collector.exit(name, time.perf_counter() - started)
+
+
+def start() -> Collector:
+    """Starts collecting in the current context."""
+    collector = Collector()
+    collector.token = _collector.set(collector)
+    return collector
+
+
+def finish(collector: Collector) -> dict:
+    """Stops collecting and returns {stage: seconds}."""
+    try:
+        _collector.reset(collector.token)
+    except ValueError:
+        # Finished from a copied context (e.g. sync middleware under ASGI).
+        _collector.set(None)
+    return collector.timings
+
+
+def log(message, timings, **fields):
+    """Emits timings as a structured record on the calculator.timing logger."""
+    logger.info(message, extra={
+        'timings_ms': {name: round(seconds * 1000, 2) for name, seconds in timings.items()},
+        **fields,
+    })
+
+
+def server_timing_header(timings: dict) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+class StageStats:
+    """Thread-safe per-stage counts and a bounded reservoir of samples."""
+
+    def __init__(self, size=512):
+        self.size = size
+        self.lock = threading.Lock()
+        self.random = random.Random()
+        self.counts = {}
+        self.samples = {}
+
+    def record(self, timings: dict):
+        with self.lock:
+            for name, seconds in timings.items():
+                count = self.counts.get(name, 0) + 1
+                self.counts[name] = count
+                samples = self.samples.setdefault(name, [])
+                if len(samples) < self.size:
+                    samples.append(seconds)
+                else:
+                    # Reservoir sampling keeps a uniform sample of every run.
+                    slot = self.random.randrange(count)
+                    if slot < self.size:
+                        samples[slot] = seconds
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            snapshot = {}
+            for name, samples in self.samples.items():
+                ordered = sorted(samples)
+                snapshot[name] = {
+                    'count': self.counts[name],
+                    'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+                    'p95_ms': round(percentile(ordered, 0.95) * 1000, 2),
+                }
+            return snapshot
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+            self.samples.clear()
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+stats = StageStats()
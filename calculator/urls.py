@@ -1,11 +1,18 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
+
+# Under ASGI the upload and results views run async (see async_views.py).
+entry = async_views if settings.CALCULATOR_ASYNC_VIEWS else views
 
 urlpatterns = [
     path('', views.calculator, name='calculator'),
-    path('upload-pdf/', views.upload_pdf, name='upload_pdf'),
-    path('results/', views.get_results, name='results'),
-    path('api/create-calculator/', views.create_id_calculator, name='create_calculator'),
+    path('upload-pdf/', entry.upload_pdf, name='upload_pdf'),
+    path('upload-pdfs/', entry.upload_pdfs, name='upload_pdfs'),
+    path('results/', entry.get_results, name='results'),
+    path('api/create-calculator/', entry.create_id_calculator, name='create_calculator'),
+    path('api/jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('api/timing-stats/', views.timing_stats, name='timing_stats'),
     path('test_calculation/<int:calculator_id>/', views.test_calculation, name='test_calculation'),
 ]
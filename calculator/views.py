@@ -1,14 +1,26 @@
 import json
+import hashlib
+import logging
+import os
+import zipfile
 
 from django.shortcuts import render, redirect
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.views.decorators.csrf import csrf_exempt
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.core.files import File
 
 from datetime import datetime
 from decimal import Decimal
 
-from .models import Calculator, CalculatorPDF, Transaction, Portfolio
-from .midas import Midas, Stock
+from .models import Calculator, CalculatorPDF, Transaction, Portfolio, ParseJob, CalculationResult, LotCheckpoint
+from .midas import Stock, DATA_VERSION, statement_cache_stats, transaction_to_json
+from .jobs import enqueue_parse
+from . import timing
+from .timing import stage
+
+logger = logging.getLogger(__name__)
 
 def calculator(request):
     return render(request, "calculator/calculator.html")
@@ -27,44 +39,120 @@ def create_id_calculator(request):
             return HttpResponseBadRequest("Invalid JSON data")
     return HttpResponseBadRequest("Invalid request method")
 
+def get_upload_calculator(request):
+    """Returns (calculator, None), or (None, error response)."""
+    calculator_id = request.POST.get('calculator_id')
+    if not calculator_id:
+        return None, JsonResponse({'error': 'Calculator ID is required'}, status=400)
+    try:
+        return Calculator.objects.get(id=calculator_id), None
+    except Calculator.DoesNotExist:
+        return None, JsonResponse({'error': 'Calculator not found'}, status=404)
+
 def upload_pdf(request):
     if request.method == 'POST':
-        calculator_id = request.POST.get('calculator_id')
-        if calculator_id:
-            try:
-                calculator = Calculator.objects.get(id=calculator_id)
-            except Calculator.DoesNotExist:
-                return JsonResponse({'error': 'Calculator not found'}, status=404)
-        else:
-            return JsonResponse({'error': 'Calculator ID is required'}, status=400)
+        calculator, error = get_upload_calculator(request)
+        if error:
+            return error
         
         pdf_file = request.FILES.get('pdf')
         if not pdf_file:
             return JsonResponse({'error': 'PDF file is required'}, status=400)
         
-        pdf_object = CalculatorPDF.objects.create(
-            calculator=calculator,
-            pdf=pdf_file
-        )
-        
-        try:
-            check_pdf(pdf_object.id)
-        except Exception as e:
-            return JsonResponse({'error': str(e)}, status=400)
-        
-        return JsonResponse({
-            'message': 'PDF uploaded and processed successfully',
-            'calculator_id': calculator.id
-        })
+        job = queue_upload(calculator, pdf_file)
+        return upload_response(calculator, job)
     return HttpResponseBadRequest("Invalid request method")
 
-def check_pdf(pdf_id):
-    pdf = CalculatorPDF.objects.get(id=pdf_id)
-    if not pdf.pdf.name.endswith('.pdf'):
-        raise ValueError("Invalid PDF file")
-    # Initialize Midas to process the PDF (this extracts info and transactions).
-    midas_instance = Midas(pdf)
-    print(f"PDF {pdf_id} processed; portfolio_date: {midas_instance.portfolio_date}")
+def queue_upload(calculator, pdf_file) -> ParseJob:
+    pdf_object = CalculatorPDF.objects.create(
+        calculator=calculator,
+        pdf=pdf_file
+    )
+    # Parsing runs in the background; the frontend polls the job status.
+    return enqueue_parse(pdf_object)
+
+def upload_response(calculator, job):
+    return JsonResponse({
+        'message': 'PDF uploaded, processing queued',
+        'calculator_id': calculator.id,
+        'job_id': job.id,
+        'status': job.status,
+    }, status=202)
+
+def iter_uploaded_statements(uploads):
+    """
+    Yields (name, file, size) for every statement in the uploaded files,
+    opening zip archives. Members are read from the archive as they are
+    stored, never extracted as a whole.
+    """
+    for upload in uploads:
+        if zipfile.is_zipfile(upload):
+            with zipfile.ZipFile(upload) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        with archive.open(info) as member:
+                            yield os.path.basename(info.filename), member, info.file_size
+        else:
+            yield upload.name, upload, upload.size
+
+def queue_statement(calculator, name, file, size) -> dict:
+    if not name.lower().endswith('.pdf'):
+        return {'file': name, 'error': 'Not a PDF file'}
+    if size > settings.CALCULATOR_MAX_UPLOAD_SIZE:
+        return {'file': name, 'error': 'File is too large'}
+    pdf_object = CalculatorPDF.objects.create(calculator=calculator, pdf=File(file, name=name))
+    job = enqueue_parse(pdf_object)
+    return {'file': name, 'job_id': job.id, 'status': job.status, 'error': job.error}
+
+def upload_pdfs(request):
+    """
+    Batch upload: any number of PDFs and zip archives of PDFs in one
+    multipart POST (field "files"). Every statement is stored and queued on
+    the parse pool; the response has one result per statement, in order.
+    """
+    if request.method != 'POST':
+        return HttpResponseBadRequest("Invalid request method")
+    calculator, error = get_upload_calculator(request)
+    if error:
+        return error
+    uploads = request.FILES.getlist('files')
+    if not uploads:
+        return JsonResponse({'error': 'At least one file is required'}, status=400)
+    results = queue_statements(calculator, uploads)
+    return JsonResponse({'calculator_id': calculator.id, 'results': results}, status=202)
+
+def queue_statements(calculator, uploads) -> list:
+    results = []
+    try:
+        for name, file, size in iter_uploaded_statements(uploads):
+            if len(results) == settings.CALCULATOR_MAX_BATCH_FILES:
+                results.append({'file': name, 'error': 'Too many files in one upload'})
+                break
+            results.append(queue_statement(calculator, name, file, size))
+    except zipfile.BadZipFile as e:
+        results.append({'file': None, 'error': f'Invalid zip archive: {e}'})
+    return results
+
+def job_status(request, job_id):
+    try:
+        job = ParseJob.objects.select_related('pdf').get(id=job_id)
+    except ParseJob.DoesNotExist:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    return JsonResponse({
+        'job_id': job.id,
+        'status': job.status,
+        'error': job.error,
+        'calculator_id': job.pdf.calculator_id,
+        'timings_ms': {name: round(seconds * 1000, 2) for name, seconds in job.timings.items()},
+    })
+
+@staff_member_required
+def timing_stats(request):
+    """
+    Per-stage counts and p50/p95 in milliseconds, for this process, and the
+    hit rate of the statement cache.
+    """
+    return JsonResponse({'stages': timing.stats.snapshot(), 'statement_cache': statement_cache_stats()})
 
 def calculate_tax(profit):
     total_profit_in_tl = Decimal(profit)
@@ -85,7 +173,7 @@ def calculate_tax(profit):
         tax_amount = Decimal("1410000") + total_profit_in_tl * Decimal("0.40")
     else: 
         tax_amount = 0
-        print("ERROR in tax amount calculation")
+        logger.error("Tax amount could not be calculated for profit %s", profit)
     return tax_amount
 
 def get_results(request):
@@ -93,25 +181,27 @@ def get_results(request):
         try:
             data = json.loads(request.body)
             calculator_id = data.get('calculator_id')
-            cal_context = calculate_results(calculator_id)
-
-            context = {
-                'total_profit_loss': f"{cal_context['profit']:.2f}",
-                'tax_amount': f"{calculate_tax(cal_context['profit']):.2f}",
-                'transaction_count': len(cal_context['transactions']),
-                'transactions': cal_context['transactions'],
-                'portfolios': [],
-                'symbol_profits': cal_context['symbol_profits'],
-            }
-
-            
-            return render(request, 'vergihesapla/results.html', context)
+            with stage("results_cache"):
+                cal_context = get_calculation(calculator_id)
+
+            with stage("render"):
+                return render(request, 'vergihesapla/results.html', results_context(cal_context))
         except Calculator.DoesNotExist:
             return JsonResponse({'error': 'Calculator not found'}, status=404)
         except Exception as e:
             raise ValueError("val error:", e)
     return render(request, 'vergihesapla/results.html')
 
+def results_context(cal_context):
+    return {
+        'total_profit_loss': f"{cal_context['profit']:.2f}",
+        'tax_amount': f"{cal_context['tax_amount']:.2f}",
+        'transaction_count': len(cal_context['transactions']),
+        'transactions': cal_context['transactions'],
+        'portfolios': [],
+        'symbol_profits': cal_context['symbol_profits'],
+    }
+
 def test_transactions(request):
     if request.method == 'POST':
         data = json.loads(request.body)
@@ -123,122 +213,319 @@ def test_transactions(request):
     return HttpResponseBadRequest("Invalid request method")
 
 def test_calculation(request, calculator_id):
-    context = calculate_results(calculator_id)
+    context = get_calculation(calculator_id)
     if request.method == 'POST':
         return JsonResponse(context)
     elif request.method == 'GET':   
         return render(request, 'vergihesapla/test_calculation.html', context)
     return HttpResponseBadRequest("Invalid request method")
 
-def calculate_results(calculator_id):
-       # Optionally run cleanup_duplicates if needed.
-    cleanup_duplicates(calculator_id)
-    calculator = Calculator.objects.get(id=calculator_id)
-    pdfs = CalculatorPDF.objects.filter(calculator=calculator).order_by('portfolio_date')
-    sorted_transactions = Transaction.objects.filter(pdf__in=pdfs).order_by('date')
-    symbols = list(set(sorted_transactions.values_list("symbol", flat=True)))
-    calculated_stocks = []
-    for symbol in symbols:
-        sorted_symbol_transactions = Transaction.objects.filter(pdf__in=pdfs, symbol=symbol).order_by('date')
-        portfolio_date = sorted_symbol_transactions.first().pdf.portfolio_date
-        
-        try:
-            first_portfolio = Portfolio.objects.get(pdf_id = pdfs.first().id, date = portfolio_date, symbol = symbol)
-        except :
-            first_portfolio = Portfolio(pdf = pdfs.first(), date = portfolio_date, symbol = symbol, quantity = 0, buy_price = 0, profit = 0)
-        stock = Stock(symbol, first_portfolio)
-
-        for transaction in sorted_symbol_transactions:
-            cleanup_duplicates(calculator_id)
-            if transaction.pdf.portfolio_date != portfolio_date:
-                try:
-                    portfolio = Portfolio.objects.get(pdf__calculator = calculator , date = portfolio_date, symbol = symbol)
-                    with open("portfolio_log.txt", "a") as f:
-                        f.write(f"\ntransaction pdf portfolio date: {transaction.pdf.portfolio_date} portfolio month: {portfolio_date.month}\n")
-                        f.write(f"portfolio exists, transaction date: {transaction.date}\n")
-                except Portfolio.DoesNotExist:
-                    with open("portfolio_log.txt", "a") as f:
-                        f.write(f"\nportfolio doesn't exist: transaction date: {transaction.date}\n")
-                    portfolio = Portfolio(date = portfolio_date, symbol = symbol, quantity = 0, buy_price = 0, profit = 0)
-                stock.check_portfolio(portfolio)
-                portfolio_date = transaction.pdf.portfolio_date
-
-            if transaction.symbol == symbol:
-                if transaction.transaction_type == "Alış":
-                    stock.add_transaction(transaction)
-                elif transaction.transaction_type == "Satış":
-                    stock.calculate_sell_transaction(transaction)
-                else:
-                    print("Invalid transaction type:", transaction.transaction_type)
-                    raise ValueError("Invalid transaction type")     
+def find_portfolio(portfolios, date, symbol, pdf_id=None):
+    """
+    In-memory stand-in for Portfolio.objects.get() over the snapshots loaded
+    by calculate_results. Returns None when no row matches.
+    """
+    matches = [
+        portfolio for portfolio in portfolios.get((date, symbol), [])
+        if pdf_id is None or portfolio.pdf_id == pdf_id
+    ]
+    if len(matches) > 1:
+        raise Portfolio.MultipleObjectsReturned(
+            f"{len(matches)} portfolio rows for {symbol} on {date}"
+        )
+    return matches[0] if matches else None
+
+CHECKPOINT_VERSION = 4
+
+def checkpoint_fingerprints(pdfs):
+    """
+    Maps each portfolio_date to a fingerprint of every statement up to and
+    including that month. pdfs must be ordered by portfolio_date.
+    """
+    digest = hashlib.sha256(f"{DATA_VERSION}:{CHECKPOINT_VERSION}".encode())
+    fingerprints = {}
+    for pdf in pdfs:
+        digest.update(f"|{pdf.id}:{pdf.sha256}:{pdf.portfolio_date.isoformat()}".encode())
+        fingerprints[pdf.portfolio_date] = digest.hexdigest()
+    return fingerprints
+
+def valid_checkpoints(calculator, fingerprints):
+    """
+    Deletes checkpoints whose statements changed and returns the valid ones
+    from the first statement month on, up to the first gap.
+    """
+    checkpoints = list(LotCheckpoint.objects.filter(calculator=calculator).order_by('portfolio_date'))
+    stale = [checkpoint.id for checkpoint in checkpoints
+             if fingerprints.get(checkpoint.portfolio_date) != checkpoint.fingerprint]
+    if stale:
+        LotCheckpoint.objects.filter(id__in=stale).delete()
+    valid = {checkpoint.portfolio_date: checkpoint for checkpoint in checkpoints if checkpoint.id not in stale}
+    chain = []
+    for date in fingerprints:
+        if date not in valid:
+            break
+        chain.append(valid[date])
+    return chain
+
+def resume_states(checkpoints):
+    """
+    Per-symbol state at the last of the checkpoints. Each checkpoint only
+    holds the sells, profits and mismatches of its own month, so these are
+    joined up across the chain.
+    """
+    states = {}
+    for checkpoint in checkpoints:
+        for symbol, state in checkpoint.state['symbols'].items():
+            previous = states.get(symbol, {'sells': [], 'profits': [], 'mismatches': []})
+            for key in ('sells', 'profits', 'mismatches'):
+                previous[key].extend(state[key])
+            states[symbol] = state | {key: previous[key] for key in ('sells', 'profits', 'mismatches')}
+    return states
+
+def checkpoint_state(stock, portfolio_date, mismatches, since):
+    """
+    The stock's state at a month boundary, with only the sells, profits and
+    mismatches since the previous boundary; since is (sells, profits,
+    mismatches) counted there.
+    """
+    sells, profits, previous_mismatches = since
+    return stock.to_state(since=(sells, profits)) | {
+        'portfolio_date': portfolio_date.isoformat(),
+        'mismatches': list(mismatches[previous_mismatches:]),
+    }
+
+def checkpoint_counts(stock, mismatches):
+    return stock.state_counts() + (len(mismatches),)
+
+def calculate_results(calculator_id, use_checkpoints=True):
+    # Everything is loaded up front in a fixed number of queries; the FIFO
+    # matching and portfolio checks below run in memory. Duplicates were
+    # already removed when the statements were ingested.
+    #
+    # The FIFO state at the end of every statement month is stored as a
+    # LotCheckpoint, so only the months after the latest valid checkpoint
+    # are replayed.
+    with stage("db_load"):
+        calculator = Calculator.objects.get(id=calculator_id)
+        pdfs = list(CalculatorPDF.objects.filter(calculator=calculator, portfolio_date__isnull=False)
+                    .order_by('portfolio_date', 'id'))
+        fingerprints = checkpoint_fingerprints(pdfs)
+        checkpoints = valid_checkpoints(calculator, fingerprints) if use_checkpoints else []
+        checkpoint = checkpoints[-1] if checkpoints else None
+
+        stocks = {}
+        statement_dates = {}
+        mismatches = {}
+        resume_date = None
+        last_transaction_date = None
+        if checkpoint is not None:
+            resume_date = checkpoint.portfolio_date
+            for symbol, state in resume_states(checkpoints).items():
+                stocks[symbol] = Stock.from_state(symbol, state)
+                statement_dates[symbol] = datetime.fromisoformat(state['portfolio_date'])
+                mismatches[symbol] = state['mismatches']
+            if checkpoint.state['last_transaction_date']:
+                last_transaction_date = datetime.fromisoformat(checkpoint.state['last_transaction_date'])
+
+        # Only statements that were parsed (and so have a portfolio date) count.
+        sorted_transactions = (Transaction.objects.filter(pdf__calculator=calculator, pdf__portfolio_date__isnull=False)
+                               .select_related('pdf').order_by('date'))
+        if resume_date is not None:
+            sorted_transactions = sorted_transactions.filter(pdf__portfolio_date__gt=resume_date)
+        transactions_by_symbol = {}
+        last_transaction_dates = {}
+        # Replaying from a checkpoint only matches a full run when statement
+        # months follow transaction dates.
+        in_statement_order = True
+        previous = None
+        for transaction in sorted_transactions:
+            if previous is None:
+                if last_transaction_date is not None and transaction.date < last_transaction_date:
+                    in_statement_order = False
+            elif transaction.pdf.portfolio_date < previous.pdf.portfolio_date:
+                in_statement_order = False
+            previous = transaction
+            last_transaction_dates[transaction.pdf.portfolio_date] = transaction.date
+            transactions_by_symbol.setdefault(transaction.symbol, []).append(transaction)
+        if not in_statement_order and checkpoint is not None:
+            return calculate_results(calculator_id, use_checkpoints=False)
+
+        portfolios = {}
+        for portfolio in Portfolio.objects.filter(pdf__calculator=calculator):
+            portfolios.setdefault((portfolio.date, portfolio.symbol), []).append(portfolio)
+
+    boundaries = [date for date in fingerprints if resume_date is None or date > resume_date]
+    snapshots = {date: {} for date in boundaries}
+
+    with stage("fifo"):
+        symbols = list(stocks) + [symbol for symbol in transactions_by_symbol if symbol not in stocks]
+        calculated_stocks = []
+        for symbol in symbols:
+            sorted_symbol_transactions = transactions_by_symbol.get(symbol, [])
+            stock = stocks.get(symbol)
+            if stock is not None:
+                portfolio_date = statement_dates[symbol]
+            else:
+                portfolio_date = sorted_symbol_transactions[0].pdf.portfolio_date
+                stock = Stock(symbol)
+
+            pending = iter(boundaries)
+            boundary = next(pending, None)
+            since = checkpoint_counts(stock, mismatches.get(symbol, []))
+            for transaction in sorted_symbol_transactions:
+                while boundary is not None and boundary < transaction.pdf.portfolio_date:
+                    snapshots[boundary][symbol] = checkpoint_state(stock, portfolio_date, mismatches.get(symbol, []), since)
+                    since = checkpoint_counts(stock, mismatches.get(symbol, []))
+                    boundary = next(pending, None)
+
+                if transaction.pdf.portfolio_date != portfolio_date:
+                    portfolio = find_portfolio(portfolios, portfolio_date, symbol)
+                    if portfolio is not None:
+                        logger.debug("Checking %s portfolio of %s before transaction on %s",
+                                     symbol, portfolio_date, transaction.date)
+                    else:
+                        logger.debug("No %s portfolio on %s before transaction on %s",
+                                     symbol, portfolio_date, transaction.date)
+                        portfolio = Portfolio(date = portfolio_date, symbol = symbol, quantity = 0, buy_price = 0, profit = 0)
+                    if not stock.check_portfolio(portfolio):
+                        mismatches.setdefault(symbol, []).append(
+                            [portfolio_date.isoformat(), str(stock.portfolio_quantity), str(portfolio.quantity)]
+                        )
+                    portfolio_date = transaction.pdf.portfolio_date
+
+                if transaction.symbol == symbol:
+                    if transaction.transaction_type == "Alış":
+                        stock.add_transaction(transaction)
+                    elif transaction.transaction_type == "Satış":
+                        stock.calculate_sell_transaction(transaction)
+                    else:
+                        logger.error("Invalid transaction type: %s", transaction.transaction_type)
+                        raise ValueError("Invalid transaction type")     
+            while boundary is not None:
+                snapshots[boundary][symbol] = checkpoint_state(stock, portfolio_date, mismatches.get(symbol, []), since)
+                since = checkpoint_counts(stock, mismatches.get(symbol, []))
+                boundary = next(pending, None)
         
-        #check last portfolio with calculation values
-        last_pdf_date = pdfs.last().portfolio_date
-        try:
-            portfolio = Portfolio.objects.get(pdf_id = pdfs.last().id, date = last_pdf_date, symbol = symbol)
-        except Portfolio.DoesNotExist:
-            portfolio = Portfolio(date = last_pdf_date, symbol = symbol, quantity = 0, buy_price = 0, profit = 0)
-            print(f"Portfolio for {symbol} on {last_pdf_date} does not exist")
-        if not stock.check_portfolio(portfolio):
-            raise ValueError("Portfolio is not corrolated at the end of the calculation")
-
-        calculated_stocks.append(stock)
+            #check last portfolio with calculation values
+            last_pdf_date = pdfs[-1].portfolio_date
+            portfolio = find_portfolio(portfolios, last_pdf_date, symbol, pdf_id=pdfs[-1].id)
+            if portfolio is None:
+                portfolio = Portfolio(date = last_pdf_date, symbol = symbol, quantity = 0, buy_price = 0, profit = 0)
+                logger.info("Portfolio for %s on %s does not exist", symbol, last_pdf_date)
+            if not stock.check_portfolio(portfolio):
+                raise ValueError("Portfolio is not corrolated at the end of the calculation")
+
+            calculated_stocks.append(stock)
+
+    with stage("checkpoint_write"):
+        if in_statement_order and boundaries:
+            checkpoints = []
+            for date in boundaries:
+                last_transaction_date = last_transaction_dates.get(date, last_transaction_date)
+                checkpoints.append(LotCheckpoint(
+                    calculator=calculator,
+                    portfolio_date=date,
+                    fingerprint=fingerprints[date],
+                    state={
+                        'symbols': snapshots[date],
+                        'last_transaction_date': last_transaction_date and last_transaction_date.isoformat(),
+                    },
+                ))
+            LotCheckpoint.objects.bulk_create(checkpoints, ignore_conflicts=True)
+
     context = {
         'profit': sum(stock.profit for stock in calculated_stocks),
         'transactions': [],
         'profits': [stock.profits_sell_transactions for stock in calculated_stocks],
         'symbols': symbols,
-        'symbol_profits': [(stock.symbol, round(sum(stock.profits_sell_transactions),2) , round(stock.usd_profit, 2)) for stock in calculated_stocks]
+        'symbol_profits': [(stock.symbol, round(sum(stock.profits_sell_transactions),2) , round(stock.usd_profit, 2)) for stock in calculated_stocks],
+        # Month-end quantities that did not match the statement's portfolio:
+        # (symbol, portfolio_date, calculated, reported).
+        'portfolio_mismatches': [
+            (symbol, datetime.fromisoformat(date), Decimal(calculated), Decimal(reported))
+            for symbol in symbols
+            for date, calculated, reported in mismatches.get(symbol, [])
+        ],
     }
     for stock in calculated_stocks:
         context['transactions'].extend(stock.calculated_sell_transactions)
     return context
 
 
-def cleanup_duplicates(calculator_id):
-    from django.db.models import Count
-    from django.db import models
-
-    calculator = Calculator.objects.get(id=calculator_id)
-    pdfs = CalculatorPDF.objects.filter(calculator=calculator)
-    
-    # Find duplicates across all PDFs for this calculator
-    duplicates = (Transaction.objects.filter(pdf__in=pdfs)
-                 .values('date', 'symbol', 'transaction_type', 'price', 'quantity')
-                 .annotate(count=Count('id'))
-                 .filter(count__gt=1)
-                 .order_by('date'))
-
-    # Print or log the duplicates
-    if len(duplicates) > 0:
-        print(f"\nFound {len(duplicates)} duplicate transactions:")
-        for dup in duplicates:
-            print("\nDuplicate group:")
-            transactions = Transaction.objects.filter(
-                pdf__in=pdfs,
-                date=dup['date'],
-                symbol=dup['symbol'],
-                transaction_type=dup['transaction_type'],
-                price=dup['price'],
-                quantity=dup['quantity']
-            ).order_by('id')
-            
-            for t in transactions:
-                print(f"ID: {t.id}, PDF: {t.pdf.id}, Date: {t.date}, Symbol: {t.symbol}, "
-                    f"Type: {t.transaction_type}, Price: {t.price}, Quantity: {t.quantity}")
-
-        # Optionally clean up the duplicates
-        for dup in duplicates:
-            transactions = Transaction.objects.filter(
-                pdf__in=pdfs,
-                date=dup['date'],
-                symbol=dup['symbol'],
-                transaction_type=dup['transaction_type'],
-                price=dup['price'],
-                quantity=dup['quantity']
-            ).order_by('id')
-            
-            # Keep the first one, delete the rest
-            first_transaction = transactions.first()
-            transactions.exclude(id=first_transaction.id).delete()
-            print(f"\nKept transaction ID {first_transaction.id}, deleted {dup['count']-1} duplicates")
+RESULTS_VERSION = 2
+
+def _fingerprint(pdfs):
+    key = json.dumps([DATA_VERSION, RESULTS_VERSION] + [[pdf_id, sha256, str(portfolio_date)] for pdf_id, sha256, portfolio_date in pdfs])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+def results_fingerprint(calculator_id):
+    pdfs = (CalculatorPDF.objects.filter(calculator_id=calculator_id)
+            .order_by('id').values_list('id', 'sha256', 'portfolio_date'))
+    return _fingerprint(pdfs)
+
+def results_fingerprints(calculator_ids):
+    """results_fingerprint() for several calculators in one query."""
+    pdfs = {calculator_id: [] for calculator_id in calculator_ids}
+    rows = (CalculatorPDF.objects.filter(calculator_id__in=calculator_ids)
+            .order_by('id').values_list('calculator_id', 'id', 'sha256', 'portfolio_date'))
+    for calculator_id, *pdf in rows:
+        pdfs[calculator_id].append(pdf)
+    return {calculator_id: _fingerprint(rows) for calculator_id, rows in pdfs.items()}
+
+def serialize_results(context):
+    return {
+        'profit': str(context['profit']),
+        'tax_amount': str(context['tax_amount']),
+        'symbols': context['symbols'],
+        'profits': [[str(profit) for profit in profits] for profits in context['profits']],
+        'symbol_profits': [[symbol, str(profit), str(usd_profit)] for symbol, profit, usd_profit in context['symbol_profits']],
+        'transactions': [transaction_to_json(transaction) for transaction in context['transactions']],
+        'portfolio_mismatches': [
+            [symbol, date.isoformat(), str(calculated), str(reported)]
+            for symbol, date, calculated, reported in context['portfolio_mismatches']
+        ],
+    }
+
+def deserialize_results(data):
+    return {
+        'profit': Decimal(data['profit']),
+        'tax_amount': Decimal(data['tax_amount']),
+        'symbols': data['symbols'],
+        'profits': [[Decimal(profit) for profit in profits] for profits in data['profits']],
+        'symbol_profits': [(symbol, Decimal(profit), Decimal(usd_profit)) for symbol, profit, usd_profit in data['symbol_profits']],
+        'transactions': [
+            transaction | {'date': datetime.fromisoformat(transaction['date'])}
+            for transaction in data['transactions']
+        ],
+        'portfolio_mismatches': [
+            (symbol, datetime.fromisoformat(date), Decimal(calculated), Decimal(reported))
+            for symbol, date, calculated, reported in data['portfolio_mismatches']
+        ],
+    }
+
+def compute_calculation(calculator_id):
+    """
+    Runs calculate_results() and returns (fingerprint, serialized results)
+    without storing them.
+    """
+    fingerprint = results_fingerprint(calculator_id)
+    context = calculate_results(calculator_id)
+    context['tax_amount'] = calculate_tax(context['profit'])
+    return fingerprint, serialize_results(context)
+
+def get_calculation(calculator_id):
+    """
+    Returns calculate_results() output plus the tax amount, served from the
+    stored CalculationResult while its fingerprint still matches.
+    """
+    fingerprint = results_fingerprint(calculator_id)
+    cached = CalculationResult.objects.filter(calculator_id=calculator_id, fingerprint=fingerprint).first()
+    if cached is not None:
+        return deserialize_results(cached.data)
+
+    fingerprint, data = compute_calculation(calculator_id)
+    CalculationResult.objects.update_or_create(
+        calculator_id=calculator_id,
+        defaults={'fingerprint': fingerprint, 'data': data},
+    )
+    return deserialize_results(data)
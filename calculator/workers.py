@@ -0,0 +1,36 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from . import log
+
+# True in the workers of process_pool(), which extract serially rather than
+# start pools of their own.
+in_pool_worker = False
+
+
+def init_worker(setup_django, log_queue):
+    """
+    Pool initializer: spawned workers start without Django configured.
+    Their logging forwards to the parent's listener through log_queue.
+    """
+    global in_pool_worker
+    in_pool_worker = True
+    log.parent_queue = log_queue
+    if setup_django:
+        import django
+        django.setup()
+
+
+def process_pool(max_workers, django=True):
+    """
+    Returns a process pool whose workers can use the ORM.
+    Workers are spawned rather than forked so they never share the parent's
+    database connections. Pass django=False for pools that only run plain
+    Python (e.g. PDF text extraction) to skip the setup cost.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(django, log.listener_queue),
+    )
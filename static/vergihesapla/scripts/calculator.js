@@ -9,6 +9,12 @@ let currentCalculatorId = null;
 
 let errorCount = 0;
 
+// Parse jobs that are still queued or running on the server
+const pendingJobs = new Set();
+const JOB_POLL_INTERVAL = 1000;
+// Give up on a job that is still queued or running after 5 minutes
+const JOB_POLL_MAX_ATTEMPTS = 300;
+
 // Add this near the top with other constants
 const calculateForm = document.getElementById('calculateForm');
 
@@ -70,12 +76,14 @@ function updateProgress(file, progress) {
 function handleFiles(e) {
     const files = Array.from(e.target.files);
     const validFiles = files.filter(file => {
-        if (file.type !== 'application/pdf') {
-            showValidation('Sadece PDF dosyaları yükleyebilirsiniz.');
+        if (file.type !== 'application/pdf' && !isZip(file)) {
+            showValidation('Sadece PDF veya ZIP dosyaları yükleyebilirsiniz.');
             return false;
         }
-        if (file.size > 10 * 1024 * 1024) {
-            showValidation('Dosya boyutu 10MB\'dan küçük olmalıdır.');
+        // Statements are limited to 10MB each; a zip may hold many of them.
+        const maxSize = isZip(file) ? 100 : 10;
+        if (file.size > maxSize * 1024 * 1024) {
+            showValidation(`Dosya boyutu ${maxSize}MB'dan küçük olmalıdır.`);
             return false;
         }
         return true;
@@ -103,7 +111,7 @@ function handleFiles(e) {
                 const fileElement = document.createElement('div');
                 fileElement.className = 'file-item';
                 fileElement.innerHTML = `
-                    <i class="far fa-file-pdf"></i>
+                    <i class="far ${isZip(file) ? 'fa-file-archive' : 'fa-file-pdf'}"></i>
                     <div class="file-details">
                         <span class="file-name">${file.name}</span>
                         <span class="file-size">${(file.size / 1024 / 1024).toFixed(2)} MB</span>
@@ -113,9 +121,9 @@ function handleFiles(e) {
                     </button>
                 `;
                 fileList.appendChild(fileElement);
-                console.log('file uploading started... \n file number: ', files.length);
-                uploadPDF(file);
             });
+            console.log('file uploading started... \n file number: ', validFiles.length);
+            uploadFiles(validFiles);
             updateCalculateButton();
         })
         .catch(error => {
@@ -134,10 +142,15 @@ function handleFiles(e) {
     updateCalculateButton();
 }
 
-// Update uploadPDF function
-async function uploadPDF(file) {
+function isZip(file) {
+    return file.type === 'application/zip' || file.type === 'application/x-zip-compressed' || file.name.toLowerCase().endsWith('.zip');
+}
+
+// Upload all selected files (PDFs and zip archives of PDFs) in one request;
+// the server answers with one result per statement.
+async function uploadFiles(files) {
     const formData = new FormData();
-    formData.append('pdf', file);
+    files.forEach(file => formData.append('files', file));
     
     // Add calculator_id to formData if we have one
     if (currentCalculatorId) {
@@ -145,7 +158,7 @@ async function uploadPDF(file) {
     }
     
     try {
-        const response = await fetch('upload-pdf/', {
+        const response = await fetch('upload-pdfs/', {
             method: 'POST',
             body: formData,
             headers: {
@@ -161,12 +174,59 @@ async function uploadPDF(file) {
         console.log('Upload successful:', data);
         // Store the calculator_id for future uploads
         currentCalculatorId = data.calculator_id;
+        data.results.forEach(result => {
+            if (result.job_id) {
+                trackJob(result.job_id, result.file);
+            } else {
+                showValidation(`${result.file || 'Dosya'} yüklenemedi: ${result.error}`, 'error');
+            }
+        });
     } catch (error) {
         console.error('Upload error:', error);
         showValidation('Dosya yükleme başarısız oldu.', 'error');
     }
 }
 
+// Poll a parse job until the server reports it as done or failed
+function trackJob(jobId, fileName) {
+    if (!jobId) {
+        return;
+    }
+    pendingJobs.add(jobId);
+    updateCalculateButton();
+    let attempts = 0;
+
+    const poll = async () => {
+        attempts++;
+        try {
+            const response = await fetch(`/calculator/api/jobs/${jobId}/`);
+            if (!response.ok) {
+                throw new Error('Job status request failed');
+            }
+            const job = await response.json();
+            const pending = job.status === 'queued' || job.status === 'running';
+            if (pending && attempts < JOB_POLL_MAX_ATTEMPTS) {
+                setTimeout(poll, JOB_POLL_INTERVAL);
+                return;
+            }
+            pendingJobs.delete(jobId);
+            if (pending) {
+                console.error('Parse job timed out:', fileName, jobId);
+                showValidation(`${fileName} işlenmesi çok uzun sürdü, lütfen tekrar yükleyin.`, 'error');
+            } else if (job.status === 'failed') {
+                console.error('Parse error:', fileName, job.error);
+                showValidation(`${fileName} işlenemedi: ${job.error}`, 'error');
+            }
+        } catch (error) {
+            pendingJobs.delete(jobId);
+            console.error('Job status error:', error);
+            showValidation('Dosya işleme durumu alınamadı.', 'error');
+        }
+        updateCalculateButton();
+    };
+    setTimeout(poll, JOB_POLL_INTERVAL);
+}
+
 // Add function to get CSRF token
 function getCookie(name) {
     let cookieValue = null;
@@ -186,7 +246,7 @@ function getCookie(name) {
 function updateCalculateButton() {
     console.log('updateCalculateButton function called');
     const hasFiles = fileList.children.length > 0;
-    calculateButton.disabled = !hasFiles;
+    calculateButton.disabled = !hasFiles || pendingJobs.size > 0;
     
 }
 
@@ -196,6 +256,10 @@ calculateButton.addEventListener('click', async () => {
         showValidation('Lütfen önce PDF dosyası yükleyin.', 'error');
         return;
     }
+    if (pendingJobs.size > 0) {
+        showValidation('Ekstreleriniz hâlâ işleniyor, lütfen bekleyin.', 'error');
+        return;
+    }
 
     try {
         const response = await fetch('/calculator/results/', {
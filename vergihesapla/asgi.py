@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vergihesapla.settings')
+# Upload and results views run async under ASGI (calculator/async_views.py).
+os.environ.setdefault('CALCULATOR_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'calculator.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,16 +76,64 @@ WSGI_APPLICATION = 'vergihesapla.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-        'OPTIONS': {
-            'timeout': 20,
+# SQLite by default; DB_ENGINE=postgresql switches to PostgreSQL configured by
+# the other DB_* variables.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'vergihesapla'),
+            'USER': os.environ.get('DB_USER', 'vergihesapla'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                'timeout': 20,
+            },
+            # Connections are kept per thread and reused across requests.
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+            # A file rather than shared-cache memory, so tests writing from
+            # several threads get SQLite's real locking (WAL, busy_timeout).
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
+
+# Applied to every new SQLite connection (calculator/db.py). WAL lets readers
+# run alongside the writer; busy_timeout is in milliseconds.
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,  # KiB
+    'mmap_size': 128 * 1024 * 1024,
 }
 
+# Databases journal_mode is not applied to. WAL mode is stored in the file
+# itself and db.sqlite3 is committed, so it keeps its rollback journal unless
+# CALCULATOR_SQLITE_WAL=1 (set it on a deployment's own copy). Test and
+# benchmark databases always use WAL.
+
+SQLITE_KEEP_JOURNAL_MODE = [] if os.environ.get('CALCULATOR_SQLITE_WAL', '0') == '1' else [str(BASE_DIR / 'db.sqlite3')]
+
+# Statement ingestion writes go through one writer thread per process
+# instead of contending for SQLite's write lock; parse pool workers only parse
+# and hand statements back to it. PostgreSQL does not need it.
+
+CALCULATOR_WRITER_THREAD = os.environ.get('CALCULATOR_WRITER_THREAD', '0' if DB_ENGINE == 'postgresql' else '1') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -132,3 +181,71 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Statement parsing
+# Uploaded PDFs are parsed by a local process pool; 0 parses inline in the request.
+
+CALCULATOR_PARSE_WORKERS = int(os.environ.get('CALCULATOR_PARSE_WORKERS', 2))
+
+# Batch uploads (upload-pdfs/): statements per request, counting zip members,
+# and the size limit of a single statement in bytes.
+
+CALCULATOR_MAX_BATCH_FILES = int(os.environ.get('CALCULATOR_MAX_BATCH_FILES', 100))
+CALCULATOR_MAX_UPLOAD_SIZE = int(os.environ.get('CALCULATOR_MAX_UPLOAD_SIZE', 10 * 1024 * 1024))
+
+# Async upload/results views (on by default under vergihesapla/asgi.py) and
+# the size of the thread pool they hand storage, parsing and calculation to.
+
+CALCULATOR_ASYNC_VIEWS = os.environ.get('CALCULATOR_ASYNC_VIEWS', '0') == '1'
+CALCULATOR_ASYNC_WORKERS = int(os.environ.get('CALCULATOR_ASYNC_WORKERS', 8))
+
+# Page text extraction is spread over a process pool for statements with at
+# least MIDAS_EXTRACT_MIN_PAGES pages; 1 worker always extracts serially, and
+# so do parse pool workers, which are already one process per statement.
+
+MIDAS_EXTRACT_WORKERS = int(os.environ.get('MIDAS_EXTRACT_WORKERS', 4))
+MIDAS_EXTRACT_MIN_PAGES = int(os.environ.get('MIDAS_EXTRACT_MIN_PAGES', 8))
+
+
+# Logging
+# Calculator logs go through a queue to a listener thread that writes the
+# rotating JSON-lines file logs/calculator.log and echoes WARNING and above to
+# stderr, so request threads never block on disk or the console. Parse pool
+# workers send their records to that listener. Records below WARNING are kept
+# with probability CALCULATOR_LOG_SAMPLE_RATE; DEBUG adds the full
+# per-statement transaction and portfolio dumps.
+
+LOG_DIR = BASE_DIR / 'logs'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'calculator.log.JsonFormatter'},
+    },
+    'filters': {
+        'sample': {
+            '()': 'calculator.log.SampleFilter',
+            'rate': float(os.environ.get('CALCULATOR_LOG_SAMPLE_RATE', 1.0)),
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'calculator.log.QueueFileHandler',
+            'filename': str(LOG_DIR / 'calculator.log'),
+            'max_bytes': 10 * 1024 * 1024,
+            'backup_count': 5,
+            'console_level': 'WARNING',
+            'formatter': 'json',
+            'filters': ['sample'],
+        },
+    },
+    'loggers': {
+        'calculator': {
+            'handlers': ['queue'],
+            'level': os.environ.get('CALCULATOR_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}